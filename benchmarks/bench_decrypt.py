@@ -0,0 +1,34 @@
+"""
+Benchmark for FT (AES-CBC) decryption, comparing the serial path with chunked multi-threaded decryption.
+Run `python -m benchmarks.bench_decrypt` from the root directory.
+
+Parallel decryption only helps with multiple CPUs, so pyfarc only uses it when there's more than one.
+(the parallel path is forced here so it can be compared on any machine)
+"""
+
+from os import cpu_count
+from secrets import token_bytes
+from timeit import timeit
+from Cryptodome.Cipher import AES
+from pydiva import pyfarc_ft_helpers
+
+def _bench(size, number=5):
+    key, iv = token_bytes(16), token_bytes(16)
+    data = AES.new(key, AES.MODE_CBC, iv=iv).encrypt(token_bytes(size))
+    
+    serial = timeit(lambda: AES.new(key, AES.MODE_CBC, iv=iv).decrypt(data), number=number) / number
+    
+    settings = (pyfarc_ft_helpers._parallel_decrypt_threshold, pyfarc_ft_helpers._parallel_decrypt_workers)
+    pyfarc_ft_helpers._parallel_decrypt_threshold = 0
+    pyfarc_ft_helpers._parallel_decrypt_workers = max(2, cpu_count() or 1) # force the parallel path
+    try:
+        parallel = timeit(lambda: pyfarc_ft_helpers._cbc_decrypt(key, iv, data), number=number) / number
+    finally:
+        pyfarc_ft_helpers._parallel_decrypt_threshold, pyfarc_ft_helpers._parallel_decrypt_workers = settings
+    
+    print ('{:>6} MiB  serial: {:8.2f}ms  parallel: {:8.2f}ms  speedup: {:.2f}x'.format(size // (1024*1024), serial * 1000, parallel * 1000, serial / parallel))
+
+if __name__ == '__main__':
+    print ('CPUs: {}'.format(cpu_count()))
+    for size in [1, 4, 16, 64, 256]:
+        _bench(size * 1024 * 1024)
@@ -0,0 +1,33 @@
+"""
+Benchmark for import time of pydiva modules. (each import runs in a fresh interpreter)
+Run `python -m benchmarks.bench_import` from the root directory.
+
+Also lists heavy dependencies loaded by each import -- pyfarc shouldn't load construct or Cryptodome until needed.
+"""
+
+import subprocess
+import sys
+from statistics import median
+
+_heavy_modules = ['construct', 'Cryptodome', 'concurrent.futures']
+
+_code = """
+import sys
+from time import perf_counter
+start = perf_counter()
+import {module}
+elapsed = perf_counter() - start
+print (elapsed, ','.join(m for m in {heavy} if m in sys.modules))
+"""
+
+def _bench(module, number=10):
+    times = []
+    for i in range(number):
+        out = subprocess.run([sys.executable, '-c', _code.format(module=module, heavy=_heavy_modules)], capture_output=True, check=True, text=True).stdout.split()
+        times += [float(out[0])]
+    loaded = out[1] if len(out) > 1 else 'none'
+    print ('{:<24} {:8.2f}ms  heavy modules: {}'.format(module, median(times) * 1000, loaded))
+
+if __name__ == '__main__':
+    for module in ['pydiva', 'pydiva.pyfarc', 'pydiva.pyfmh3', 'pydiva.identify_helper', 'construct']:
+        _bench(module)
@@ -0,0 +1,27 @@
+"""
+Benchmark for CS3 relocation table generation.
+Run `python -m benchmarks.bench_relocation` from the root directory.
+"""
+
+import random
+from timeit import timeit
+from pydiva.util.cs3_file_utils import RelocationTableBuilder, gen_relocation_data, relocation_data_len
+
+def _bench(n):
+    random.seed(39)
+    offsets = random.sample(range(n * 8), n)
+    
+    def build():
+        builder = RelocationTableBuilder()
+        for o in offsets:
+            builder.add(o)
+        builder.data()
+        relocation_data_len(builder)
+    
+    t_builder = timeit(build, number=3) / 3
+    t_encode = timeit(lambda: gen_relocation_data(sorted(offsets)), number=3) / 3
+    print ('{:>7} pointers: builder {:.4f}s, gen_relocation_data {:.4f}s'.format(n, t_builder, t_encode))
+
+if __name__ == '__main__':
+    for n in [10000, 100000]:
+        _bench(n)
@@ -0,0 +1,6 @@
+def __getattr__(name):
+    # imported on first use to keep importing pydiva (and running the pyfarc command line) fast
+    if name in ['identify', 'identify_many']:
+        from pydiva import identify_helper
+        return getattr(identify_helper, name)
+    raise AttributeError("module 'pydiva' has no attribute '{}'".format(name))
@@ -0,0 +1,105 @@
+"""
+asyncio wrappers for reading farc archives and fontmaps without blocking the event loop.
+
+File reads and CPU work (decryption, decompression, parsing) run in a bounded thread pool, so many concurrent requests
+can overlap I/O and CPU. (AES and zlib release the GIL while working)
+Pass executor to any coroutine to use your own executor instead of the shared default.
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count
+from threading import Lock
+from pydiva import pyfarc, pyfmh3
+
+_default_executor = None
+_default_executor_lock = Lock()
+
+def _get_default_executor():
+    """Gets the shared executor, creating it on first use."""
+    
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(max_workers=min(32, (cpu_count() or 1) + 4), thread_name_prefix='pydiva_aio')
+        return _default_executor
+
+async def _run(executor, func, *args):
+    """Runs func(*args) in executor (or the default executor) from a coroutine."""
+    
+    return await asyncio.get_running_loop().run_in_executor(executor or _get_default_executor(), func, *args)
+
+def _read_table(path):
+    """Reads the files table of a farc at path."""
+    
+    with open(path, 'rb') as f:
+        return pyfarc.table_from_stream(f)
+
+def _read_stored(path, infos):
+    """Reads stored data for a list of table infos in one open, in pointer order."""
+    
+    out = [None] * len(infos)
+    with open(path, 'rb') as f:
+        for i in sorted(range(len(infos)), key=lambda i: infos[i]['pointer']):
+            if f.tell() != infos[i]['pointer']:
+                f.seek(infos[i]['pointer'])
+            out[i] = pyfarc._read_exact(f, infos[i]['stored_size'])
+    return out
+
+def _read_file(path):
+    """Reads a whole file."""
+    
+    with open(path, 'rb') as f:
+        return f.read()
+
+async def open_farc(path, executor=None):
+    """
+    Reads the files table of a farc at path. (see pyfarc.table_from_stream)
+    The result can be passed to read_entry and extract_all to avoid reading it again.
+    """
+    
+    return await _run(executor, _read_table, path)
+
+async def read_entry(path, fname, table=None, executor=None):
+    """
+    Reads and decodes a single file from the farc at path.
+    Raises KeyError if the file isn't in the archive.
+    """
+    
+    if table is None:
+        table = await open_farc(path, executor)
+    
+    info = table['files'][fname]
+    stored, = await _run(executor, _read_stored, path, [info])
+    return await _run(executor, pyfarc._decode_file, stored, info, pyfarc._table_farc_type(table))
+
+async def extract_all(path, table=None, files_whitelist=None, executor=None):
+    """
+    Reads and decodes all files from the farc at path, returning a dictionary of {filename: bytes}.
+    Stored data is read in one pass and files are decoded concurrently.
+    Setting files_whitelist will only extract files with names in the whitelist.
+    """
+    
+    if table is None:
+        table = await open_farc(path, executor)
+    
+    names = [fname for fname in table['files'] if not files_whitelist or fname in files_whitelist]
+    infos = [table['files'][fname] for fname in names]
+    farc_type = pyfarc._table_farc_type(table)
+    
+    stored = await _run(executor, _read_stored, path, infos)
+    decoded = await asyncio.gather(*[_run(executor, pyfarc._decode_file, data, info, farc_type) for data, info in zip(stored, infos)])
+    return dict(zip(names, decoded))
+
+async def load_fontmap(path, fname=None, validate_relocation=False, executor=None):
+    """
+    Loads a fontmap from path, returning a dictionary like pyfmh3.from_bytes.
+    If fname is set, path is a farc and the fontmap is loaded from the file fname inside it.
+    """
+    
+    if fname is None:
+        data = await _run(executor, _read_file, path)
+    else:
+        data = await read_entry(path, fname, executor=executor)
+    
+    return await _run(executor, pyfmh3.from_bytes, data, validate_relocation)
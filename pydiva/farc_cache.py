@@ -0,0 +1,139 @@
+"""
+Cache for decoded farc files, shared between archives, with a memory budget and LRU eviction.
+"""
+
+from collections import OrderedDict
+from os import stat
+from threading import Lock
+from pydiva import pyfarc
+
+
+class EntryCache:
+    """
+    Caches decoded file data from farc archives, keyed by (archive path, mtime_ns, size, filename).
+    Archives that change on disk get new keys, so stale data is never returned (it's evicted as it gets old).
+    
+    max_bytes limits the total size of cached data. Least recently used files are evicted when it would be exceeded,
+    and files larger than max_bytes are never cached.
+    max_tables limits how many archives' files tables are kept, also evicting the least recently used.
+    
+    Safe to share between threads.
+    """
+    
+    def __init__(self, max_bytes=64*1024*1024, max_tables=256):
+        self.max_bytes = max_bytes
+        self.max_tables = max_tables
+        self._entries = OrderedDict() # key -> bytes, least recently used first
+        self._tables = OrderedDict()  # archive path -> (stat, table), least recently used first
+        self._size = 0
+        self._lock = Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    @staticmethod
+    def _archive_stat(path):
+        """Gets (mtime_ns, size) for an archive, used in keys."""
+        
+        st = stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    
+    def _get_table(self, path, archive_stat):
+        """Gets the files table for an archive, reading it if not cached or changed on disk."""
+        
+        with self._lock:
+            cached = self._tables.get(path)
+            if cached and cached[0] == archive_stat:
+                self._tables.move_to_end(path)
+                return cached[1]
+        
+        with open(path, 'rb') as f:
+            table = pyfarc.table_from_stream(f)
+        
+        with self._lock:
+            self._tables[path] = (archive_stat, table)
+            self._tables.move_to_end(path)
+            while len(self._tables) > max(self.max_tables, 1):
+                self._tables.popitem(last=False)
+        return table
+    
+    def _evict(self):
+        """Evicts least recently used entries until the cache fits in max_bytes. Call with lock held."""
+        
+        while self._size > self.max_bytes:
+            key, data = self._entries.popitem(last=False)
+            self._size -= len(data)
+            self._stats['evictions'] += 1
+    
+    def get_or_load(self, key, loader):
+        """
+        Returns cached data for key, or calls loader() to get the data and caches it.
+        Keys should include something that changes when the data does. (like mtime and size of an archive)
+        """
+        
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._stats['hits'] += 1
+                return data
+            self._stats['misses'] += 1
+        
+        data = loader()
+        
+        if len(data) <= self.max_bytes:
+            with self._lock:
+                if not key in self._entries:
+                    self._entries[key] = data
+                    self._size += len(data)
+                    self._evict()
+        
+        return data
+    
+    def get(self, path, fname):
+        """
+        Returns decoded data for file fname in the farc at path.
+        Raises KeyError if the file isn't in the archive, or pyfarc.UnsupportedFarcTypeException if path is not a
+        supported farc.
+        """
+        
+        archive_stat = self._archive_stat(path)
+        key = (path, archive_stat[0], archive_stat[1], fname)
+        
+        def _load():
+            table = self._get_table(path, archive_stat)
+            with open(path, 'rb') as f:
+                return pyfarc.file_from_stream(f, table, fname)
+        
+        return self.get_or_load(key, _load)
+    
+    def get_many(self, path, filenames):
+        """
+        Returns a list of tuples [(filename, bytes)] for files in the farc at path, in archive order.
+        Files not present in the archive are ignored, and all files are returned if filenames is empty or None, like
+        farc_load_helper.
+        Raises pyfarc.UnsupportedFarcTypeException if path is not a supported farc.
+        """
+        
+        table = self._get_table(path, self._archive_stat(path))
+        return [(fname, self.get(path, fname)) for fname in table['files'] if not filenames or fname in filenames]
+    
+    def stats(self):
+        """Returns a dictionary of hits, misses, evictions, entries (count), bytes (cached size), and max_bytes."""
+        
+        with self._lock:
+            return dict(self._stats, entries=len(self._entries), bytes=self._size, max_bytes=self.max_bytes)
+    
+    def clear(self):
+        """Removes all cached data and tables. Statistics are kept."""
+        
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self._size = 0
+    
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+    
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
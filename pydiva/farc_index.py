@@ -0,0 +1,147 @@
+"""
+Persistent index of files tables for collections of farc archives, stored in a single SQLite file.
+
+Loading an index avoids opening (and for FT, decrypting the header of) every archive at startup.
+Archive mtime and size are stored so changed archives can be detected and reindexed.
+"""
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from os import stat
+from pydiva import pyfarc
+
+_schema = """
+CREATE TABLE IF NOT EXISTS archives (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    farc_type TEXT NOT NULL,
+    format INTEGER,
+    alignment INTEGER NOT NULL,
+    encrypted INTEGER,
+    compressed INTEGER
+);
+CREATE TABLE IF NOT EXISTS files (
+    archive_id INTEGER NOT NULL REFERENCES archives(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    pointer INTEGER NOT NULL,
+    stored_size INTEGER NOT NULL,
+    compressed_size INTEGER NOT NULL,
+    uncompressed_size INTEGER NOT NULL,
+    encrypted INTEGER NOT NULL,
+    compressed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS files_archive_id ON files(archive_id);
+"""
+
+def _archive_stat(path):
+    """Gets (mtime_ns, size) for an archive, used to detect changes."""
+    
+    st = stat(path)
+    return (st.st_mtime_ns, st.st_size)
+
+def _read_table(path):
+    """Reads stat and files table for an archive."""
+    
+    archive_stat = _archive_stat(path)
+    with open(path, 'rb') as f:
+        return archive_stat, pyfarc.table_from_stream(f)
+
+def _connect(index_path):
+    """Opens an index file, creating tables if needed."""
+    
+    conn = sqlite3.connect(index_path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.executescript(_schema)
+    return conn
+
+def update_index(index_path, farc_paths, workers=1):
+    """
+    Creates or updates an index file for a list of farc paths.
+    Only new archives and archives that changed since they were indexed (by mtime and size) are read, and archives
+    not in farc_paths are removed from the index.
+    Returns a list of paths that were (re)indexed.
+    
+    Raises pyfarc.UnsupportedFarcTypeException if any path is not a supported farc.
+    """
+    
+    farc_paths = dict.fromkeys(farc_paths) # dedupes in order, with fast lookups for removed
+    
+    with _connect(index_path) as conn:
+        indexed = {path: (mtime_ns, size) for path, mtime_ns, size in conn.execute('SELECT path, mtime_ns, size FROM archives')}
+        
+        changed = [path for path in farc_paths if indexed.get(path) != _archive_stat(path)]
+        
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                tables = list(executor.map(_read_table, changed))
+        else:
+            tables = [_read_table(path) for path in changed]
+        
+        removed = [(path,) for path in indexed if not path in farc_paths]
+        conn.executemany('DELETE FROM archives WHERE path = ?', removed + [(path,) for path in changed])
+        
+        for path, (archive_stat, table) in zip(changed, tables):
+            flags = table.get('flags', {})
+            archive_id = conn.execute(
+                'INSERT INTO archives (path, mtime_ns, size, farc_type, format, alignment, encrypted, compressed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (path, archive_stat[0], archive_stat[1], table['farc_type'], table.get('format'), table['alignment'], flags.get('encrypted'), flags.get('compressed'))
+            ).lastrowid
+            
+            conn.executemany(
+                'INSERT INTO files (archive_id, name, pointer, stored_size, compressed_size, uncompressed_size, encrypted, compressed) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                [(archive_id, fname, info['pointer'], info['stored_size'], info['compressed_size'], info['uncompressed_size'], info['flags']['encrypted'], info['flags']['compressed']) for fname, info in table['files'].items()]
+            )
+    
+    conn.close()
+    return changed
+
+def load_index(index_path, validate=True):
+    """
+    Loads an index file created by update_index.
+    Returns a dictionary of {path: {'stat': (mtime_ns, size), 'table': table}}, where table is formatted like the
+    result of pyfarc.table_from_stream.
+    
+    If validate is set, archives that are missing or changed on disk are left out.
+    """
+    
+    conn = _connect(index_path)
+    
+    archives = {}
+    by_id = {}
+    for archive_id, path, mtime_ns, size, farc_type, format, alignment, encrypted, compressed in conn.execute(
+        'SELECT id, path, mtime_ns, size, farc_type, format, alignment, encrypted, compressed FROM archives'
+    ):
+        table = {'farc_type': farc_type, 'files': {}, 'alignment': alignment}
+        if encrypted is not None:
+            table['flags'] = {'encrypted': bool(encrypted), 'compressed': bool(compressed)}
+        if format is not None:
+            table['format'] = format
+        
+        archives[path] = {'stat': (mtime_ns, size), 'table': table}
+        by_id[archive_id] = table['files']
+    
+    for archive_id, fname, pointer, stored_size, compressed_size, uncompressed_size, encrypted, compressed in conn.execute(
+        'SELECT archive_id, name, pointer, stored_size, compressed_size, uncompressed_size, encrypted, compressed FROM files ORDER BY rowid'
+    ):
+        by_id[archive_id][fname] = {
+            'pointer': pointer,
+            'stored_size': stored_size,
+            'compressed_size': compressed_size,
+            'uncompressed_size': uncompressed_size,
+            'flags': {'encrypted': bool(encrypted), 'compressed': bool(compressed)}
+        }
+    
+    conn.close()
+    
+    if validate:
+        for path in list(archives):
+            try:
+                if _archive_stat(path) == archives[path]['stat']:
+                    continue
+            except FileNotFoundError:
+                pass
+            del archives[path]
+    
+    return archives
@@ -2,23 +2,83 @@
 Helper for when you want to load a file that may or may not be inside a farc archive.
 """
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BufferedReader, FileIO
+from os.path import isfile
 from pydiva import pyfarc
+from pydiva.identify_helper import identify
 
-def farc_load_helper(s, filenames):
+def _load_from_stream(s, filenames):
+    """
+    Loads requested files from stream s using only the files table and requested file data.
+    The file type is checked from a small prefix first, so non-farc streams are returned whole from their original position.
+    """
+    
+    pos = s.tell()
+    if identify(s)['type'] != 'farc':
+        return [(None, s.read())]
+    
+    try:
+        table = pyfarc.table_from_stream(s)
+    except pyfarc.UnsupportedFarcTypeException:
+        s.seek(pos)
+        return [(None, s.read())]
+    
+    return [(fname, pyfarc.file_from_stream(s, table, fname)) for fname in table['files'] if not filenames or fname in filenames]
+
+def _load_from_source(source, filenames, cache):
+    """Loads requested files from a path or stream. (see farc_load_many)"""
+    
+    if hasattr(source, 'read'):
+        return farc_load_helper(source, filenames, cache)
+    
+    with open(source, 'rb') as f:
+        return farc_load_helper(f, filenames, cache)
+
+def farc_load_helper(s, filenames, cache=None):
     """
     Takes a stream and list of desired files, returns a list of tuples [(filename, bytes)]
     If stream s does not contain a supported farc file, returns original bytes with filenamee None.
     Otherwise, opens the archive and returns the requested files if present.
     (files not present in the archive will be ignored)
+    
+    If cache is a farc_cache.EntryCache and s is a file opened from a path and positioned at its start, decoded files
+    are loaded through the cache. (other streams are read directly, since the cache reads archives by path)
     """
     
-    try:
-        farc = pyfarc.from_stream(s, files_whitelist=filenames)
-    except pyfarc.UnsupportedFarcTypeException:
-        return [(None, s.read())]
+    path = getattr(s, 'name', None)
+    if cache is not None and isinstance(s, (BufferedReader, FileIO)) and isinstance(path, str) and isfile(path) and s.tell() == 0:
+        if identify(s)['type'] != 'farc':
+            return [(None, s.read())]
+        try:
+            return cache.get_many(path, filenames)
+        except pyfarc.UnsupportedFarcTypeException:
+            return [(None, s.read())]
+    
+    return _load_from_stream(s, filenames)
+
+def farc_load_many(requests, workers=8, cache=None):
+    """
+    Takes an iterable of (path or stream, filenames) requests and loads them like farc_load_helper, reading sources
+    concurrently using a thread pool.
+    
+    This is a generator that yields tuples of (request index, filename, bytes) as each source finishes, so results may
+    not be in request order. (sources that aren't farc files yield their original bytes with filename None)
+    Only the files table and requested files are read from each archive.
+    
+    Streams should not be shared between requests.
+    """
+    
+    requests = list(requests)
     
-    outlist = []
-    for fname, info in farc['files'].items():
-        outlist += [(fname, info['data'])]
+    if workers <= 1:
+        for i, (source, filenames) in enumerate(requests):
+            for fname, data in _load_from_source(source, filenames, cache):
+                yield (i, fname, data)
+        return
     
-    return outlist
\ No newline at end of file
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(_load_from_source, source, filenames, cache): i for i, (source, filenames) in enumerate(requests)}
+        for future in as_completed(futures):
+            for fname, data in future.result():
+                yield (futures[future], fname, data)
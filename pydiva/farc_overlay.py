@@ -0,0 +1,165 @@
+"""
+Overlay filesystem for looking up files in a stack of farc archives and directories.
+"""
+
+from os import fstat, listdir, stat
+from os.path import isdir, isfile, join as joinpath
+from pydiva import pyfarc
+
+
+class ArchiveOverlay:
+    """
+    Indexes the files tables of many farc archives and directories so filenames can be looked up in constant time.
+    Sources mounted later override files from earlier sources.
+    
+    Only files tables are read when mounting, and file data is read when requested.
+    Call refresh to reindex sources that have changed on disk (checked using mtime and size).
+    
+    Set saved_index to a result of farc_index.load_index to use saved files tables for unchanged archives instead of
+    reading them.
+    Set cache to a farc_cache.EntryCache to cache decoded files from archives (can be shared with other overlays).
+    """
+    
+    def __init__(self, paths=(), saved_index=None, cache=None):
+        self._sources = [] # list of source dicts, in mount order
+        self._index = {}   # filename -> (source dict, info)
+        self._saved_index = saved_index or {}
+        self._cache = cache
+        
+        for path in paths:
+            self.mount(path)
+    
+    @staticmethod
+    def _source_stat(path):
+        """Gets info used to detect changes to a source."""
+        
+        st = stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    
+    def _read_source(self, source):
+        """Reads the files table for a source dict (directory listing or farc files table)."""
+        
+        source['stat'] = self._source_stat(source['path'])
+        saved = self._saved_index.get(source['path'])
+        
+        if saved and saved['stat'] == source['stat'] and not source['is_dir']:
+            source['table'] = saved['table']
+            source['files'] = source['table']['files']
+        elif source['is_dir']:
+            source['files'] = {fname: None for fname in listdir(source['path']) if isfile(joinpath(source['path'], fname))}
+            source['table'] = None
+        else:
+            with open(source['path'], 'rb') as f:
+                source['table'] = pyfarc.table_from_stream(f)
+            source['files'] = source['table']['files']
+    
+    def _rebuild_index(self):
+        """Rebuilds the filename index from all sources' cached files tables."""
+        
+        self._index = {}
+        for source in self._sources:
+            for fname, info in source['files'].items():
+                self._index[fname] = (source, info)
+    
+    def mount(self, path):
+        """
+        Mounts a farc archive or directory on top of existing sources.
+        Raises pyfarc.UnsupportedFarcTypeException if path is a file but not a supported farc.
+        """
+        
+        source = {'path': path, 'is_dir': isdir(path)}
+        self._read_source(source)
+        self._sources += [source]
+        
+        for fname, info in source['files'].items():
+            self._index[fname] = (source, info)
+    
+    def unmount(self, path):
+        """Unmounts all sources with the given path."""
+        
+        self._sources = [s for s in self._sources if s['path'] != path]
+        self._rebuild_index()
+    
+    def refresh(self):
+        """
+        Reindexes sources that changed since they were indexed, and unmounts sources that no longer exist.
+        Returns a list of paths that were reindexed or unmounted.
+        """
+        
+        changed = []
+        sources = []
+        for source in self._sources:
+            try:
+                if self._source_stat(source['path']) != source['stat']:
+                    self._read_source(source)
+                    changed += [source['path']]
+                sources += [source]
+            except FileNotFoundError:
+                changed += [source['path']]
+        
+        if changed:
+            self._sources = sources
+            self._rebuild_index()
+        
+        return changed
+    
+    def sources(self):
+        """Returns a list of mounted paths, in mount order."""
+        
+        return [s['path'] for s in self._sources]
+    
+    def lookup(self, fname):
+        """
+        Returns a tuple of (source path, info) for the source that provides fname, or None if not found.
+        info is the file's entry from pyfarc.table_from_stream for archives, or None for directories.
+        """
+        
+        res = self._index.get(fname)
+        if not res:
+            return None
+        return (res[0]['path'], res[1])
+    
+    def read(self, fname):
+        """Reads a file's data from the source that provides it. Raises KeyError if not found."""
+        
+        source, info = self._index[fname]
+        
+        if source['is_dir']:
+            with open(joinpath(source['path'], fname), 'rb') as f:
+                return f.read()
+        
+        def _load():
+            with open(source['path'], 'rb') as f:
+                return pyfarc.file_from_stream(f, source['table'], fname)
+        
+        if self._cache is None:
+            return _load()
+        return self._cache.get_or_load((source['path'], source['stat'][0], source['stat'][1], fname), _load)
+    
+    def read_into(self, fname, buffer):
+        """
+        Reads a file's data into a writable buffer from the source that provides it, without creating a bytes object
+        for the whole file. (see pyfarc.read_entry_into)
+        Returns the number of bytes written. Raises KeyError if not found.
+        """
+        
+        source, info = self._index[fname]
+        
+        if not source['is_dir']:
+            with open(source['path'], 'rb') as f:
+                return pyfarc.read_entry_into(f, source['table'], fname, buffer)
+        
+        with open(joinpath(source['path'], fname), 'rb') as f:
+            size = fstat(f.fileno()).st_size
+            if memoryview(buffer).nbytes < size:
+                raise ValueError("buffer is too small for {} ({} < {} bytes)".format(fname, memoryview(buffer).nbytes, size))
+            return f.readinto(buffer)
+    
+    def __contains__(self, fname):
+        return fname in self._index
+    
+    def __iter__(self):
+        return iter(self._index)
+    
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,138 @@
+"""
+Helper for quickly identifying farc and fontmap files from a small prefix, without parsing them.
+"""
+
+from pydiva.pyfarc_formats import _farc_types
+from pydiva.pyfmh3_formats import _fmh3_types
+from pydiva.pyfarc_ft_helpers import _is_FT_FARC_prefix, _needs_FT_decryption_prefix, _cryptodome_installed, _aes
+
+_prefix_size = 128 # enough for FT header IV + first encrypted block and FONM + FMH3 headers
+
+def _identify_farc(b, magic_str):
+    """Gets farc info from prefix bytes b for a known farc magic_str."""
+    
+    farc_type = _farc_types[magic_str]
+    
+    res = {
+        'type': 'farc',
+        'subformat': magic_str,
+        'encrypted': False,
+        'compressed': farc_type['compression_forced'],
+        'header_encrypted': False,
+        'alignment': int.from_bytes(b[8:12], byteorder='big', signed=True),
+        'header_size': int.from_bytes(b[4:8], byteorder='big', signed=False),
+        'entry_count': None,
+    }
+    
+    if not farc_type['has_flags']:
+        return res
+    
+    res['encrypted'] = True if b[11] & 4 else False
+    res['compressed'] = True if b[11] & 2 else False
+    res['alignment'] = int.from_bytes(b[16:20], byteorder='big', signed=True)
+    
+    if not _is_FT_FARC_prefix(b):
+        return res
+    
+    res['subformat'] = 'FARC_FT'
+    header = b[16:32]
+    
+    if _needs_FT_decryption_prefix(b):
+        res['header_encrypted'] = True
+        if not _cryptodome_installed() or len(b) < 48:
+            res['alignment'] = None
+            return res
+        
+        # only the first block is needed for alignment, format and entry_count
+        AES = _aes()
+        cipher = AES.new(_farc_types['FARC_FT']['encryption_key'], AES.MODE_CBC, iv=b[16:32])
+        header = cipher.decrypt(b[32:48])
+    
+    res['alignment'] = int.from_bytes(header[0:4], byteorder='big', signed=True)
+    res['entry_count'] = int.from_bytes(header[8:12], byteorder='big', signed=True)
+    return res
+
+def _identify_fmh3(b, magic_str):
+    """Gets fontmap info from prefix bytes b for a known fontmap magic_str."""
+    
+    fmh3_type = _fmh3_types[magic_str]
+    
+    if 'alternate_type_checks' in fmh3_type:
+        for t in fmh3_type['alternate_type_checks']:
+            if all(len(b) > c['offset'] and b[c['offset']] & c['mask'] for c in t['checks']):
+                magic_str = t['type']
+                fmh3_type = _fmh3_types[magic_str]
+                break
+    
+    fmh3_offset = 0
+    if fmh3_type['nest_fmh3_data']:
+        fmh3_offset = int.from_bytes(b[8:12], byteorder='little', signed=False) # data_pointer of section
+    
+    fonts_count = b[fmh3_offset + 8:fmh3_offset + 12]
+    
+    return {
+        'type': 'fmh3',
+        'subformat': magic_str,
+        'encrypted': False,
+        'compressed': False,
+        'header_encrypted': False,
+        'alignment': None,
+        'header_size': None,
+        'entry_count': int.from_bytes(fonts_count, byteorder='big' if fmh3_type['byte_order'] == '>' else 'little') if len(fonts_count) == 4 else None,
+    }
+
+def identify_bytes(b):
+    """
+    Identifies a farc or fontmap from the first bytes of a file (at least 128 bytes unless the file is shorter).
+    
+    Returns a dictionary with:
+    type ('farc', 'fmh3', or None if not identified),
+    subformat (internal type name -- FArc/FArC/FARC/FARC_FT or FMH3/FONM/FONM_F2),
+    encrypted, compressed (farc flags), header_encrypted (FT only),
+    alignment, header_size, entry_count (number of files or fonts, if known without parsing).
+    """
+    
+    b = bytes(b[:_prefix_size])
+    magic_str = b[:4].decode('ascii', errors='replace')
+    
+    try:
+        if magic_str in _farc_types and len(b) >= 32:
+            return _identify_farc(b, magic_str)
+        if magic_str in _fmh3_types and len(b) >= 16:
+            return _identify_fmh3(b, magic_str)
+    except IndexError: # truncated file
+        pass
+    
+    return {'type': None, 'subformat': None, 'encrypted': None, 'compressed': None, 'header_encrypted': None, 'alignment': None, 'header_size': None, 'entry_count': None}
+
+def identify(path_or_stream):
+    """
+    Identifies a farc or fontmap from a path or stream with a single read.
+    Stream position is restored after reading if the stream is seekable.
+    See identify_bytes for the returned dictionary.
+    """
+    
+    if hasattr(path_or_stream, 'read'):
+        s = path_or_stream
+        pos = s.tell() if s.seekable() else None
+        b = s.read(_prefix_size)
+        if pos is not None:
+            s.seek(pos)
+        return identify_bytes(b)
+    
+    with open(path_or_stream, 'rb') as f:
+        return identify_bytes(f.read(_prefix_size))
+
+def identify_many(paths, workers=8):
+    """
+    Identifies many files from a list of paths (or streams) using a thread pool.
+    Returns a list of dictionaries in the same order as paths. (see identify_bytes)
+    """
+    
+    if workers <= 1:
+        return [identify(p) for p in paths]
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(identify, paths))
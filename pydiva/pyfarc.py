@@ -4,19 +4,13 @@ pyfarc reader and writer for farc archives
 
 from copy import deepcopy
 from io import BytesIO
-from secrets import token_bytes
-from os import getenv
+from time import perf_counter
 import gzip
 import zlib # gzip module's decompress doesn't handle junk at end of file
 from pydiva.pyfarc_formats import _farc_types
-from pydiva.pyfarc_ft_helpers import _is_FT_FARC, _decrypt_FT_FARC_header, _encrypt_FT_FARC_header
+from pydiva.pyfarc_ft_helpers import _is_FT_FARC_prefix, _needs_FT_decryption_prefix, _decrypt_FT_FARC_header_bytes, _encrypt_FT_FARC_header_bytes, _cryptodome_installed, _aes, _cbc_decrypt, _FT_iv, _iv_modes
 
-try:
-    from Cryptodome.Cipher import AES
-    from Cryptodome.Util.Padding import pad
-    _cryptodome_installed = True
-except Exception:
-    _cryptodome_installed = False
+_parallel_compress_threshold = 8*1024*1024 # files at least this big are compressed on multiple threads
 
 
 class UnsupportedFarcTypeException(Exception):
@@ -28,7 +22,7 @@ def check_farc_type(t):
     if not t in _farc_types:
         raise UnsupportedFarcTypeException("{} type not supported".format(t))
     
-    if _farc_types[t]['encryption_type'] and not _cryptodome_installed:
+    if _farc_types[t]['encryption_type'] and not _cryptodome_installed():
         raise UnsupportedFarcTypeException("{} type only supported with Cryptodome module installed".format(t))
     
     return _farc_types[t]['remarks']
@@ -43,13 +37,51 @@ def _files_header_size_calc(files, farc_type):
         size += farc_type['files_header_fields_size']
     return size
 
-def _prep_files(files, alignment, farc_type, flags):
-    """Gets files ready for writing by compressing them and calculating pointers."""
+def _plan_layout(files, alignment, layout):
+    """
+    Gets the order to store files' data in (see to_stream for layout).
+    Returns a tuple of (list of filenames in storage order, {filename: earlier filename with identical data to share}).
+    """
+    
+    names = list(files)
+    if layout is None:
+        return names, {}
+    
+    if layout == 'compact':
+        shared = {}
+        first = {}
+        for fname in names:
+            data = files[fname]['data']
+            if data in first:
+                shared[fname] = first[data]
+            elif data:
+                first[data] = fname
+        
+        # padding after each file only depends on its size, except that none is written after the last file, so put
+        # the file needing the most padding last
+        names = sorted([fname for fname in names if not fname in shared], key=lambda fname: -len(files[fname]['data']) % alignment)
+        return names, shared
+    
+    profile = [fname for fname in dict.fromkeys(layout) if fname in files]
+    profile_set = set(profile)
+    return profile + [fname for fname in names if not fname in profile_set], {}
+
+def _prep_files(files, alignment, farc_type, flags, stats=None, iv_mode=None, layout=None):
+    """
+    Gets files ready for writing by compressing them and calculating pointers.
+    Returns the list of filenames in storage order, leaving out files sharing data with another file.
+    """
     
     def _compress_files(files, farc_type):
         for fname, info in files.items():
             if info['flags']['compressed']:
-                data_compressed = gzip.compress(info['data'], mtime=39) # set mtime for reproducible output
+                if stats: start = perf_counter()
+                if len(info['data']) >= _parallel_compress_threshold:
+                    from pydiva.util import parallel_gzip
+                    data_compressed = parallel_gzip.compress(info['data'], mtime=39)
+                else:
+                    data_compressed = gzip.compress(info['data'], mtime=39) # set mtime for reproducible output
+                if stats: stats.add('deflate', start, len(info['data']), len(data_compressed))
                 if farc_type['compression_forced'] or (len(data_compressed) < len(info['data'])):
                     info['data'] = data_compressed
                     info['flags']['compressed'] = True
@@ -65,7 +97,11 @@ def _prep_files(files, alignment, farc_type, flags):
             if not info['flags']['encrypted']:
                 continue
             
+            from Cryptodome.Util.Padding import pad
+            AES = _aes()
+            
             data = info['data']
+            if stats: start = perf_counter()
             
             if farc_type['encryption_type'] == 'DT':
                 while len(data) % 16:
@@ -74,32 +110,35 @@ def _prep_files(files, alignment, farc_type, flags):
                 data = cipher.encrypt(data)
             elif farc_type['encryption_type'] == 'FT':
                 data = pad(data, 16, 'pkcs7')
-                if getenv('PYFARC_NULL_IV'):
-                    iv = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
-                else:
-                    iv = token_bytes(16)
-                cipher = AES.new(b'\x13\x72\xD5\x7B\x6E\x9E\x31\xEB\xA2\x39\xB8\x3C\x15\x57\xC6\xBB', AES.MODE_CBC, iv=iv)
+                iv = _FT_iv(iv_mode, farc_type['encryption_key'], data, fname)
+                cipher = AES.new(farc_type['encryption_key'], AES.MODE_CBC, iv=iv)
                 data = iv + cipher.encrypt(data)
                 
                 # encrypted FT FARC "compressed" length seems to include IV and be aligned
                 info['len_compressed'] = len(data)
             
+            if stats: stats.add('encrypt', start, len(info['data']), len(data))
             info['data'] = data
        
-    def _set_files_pointers(files, alignment, farc_type, encrypted):
+    def _set_files_pointers(files, alignment, farc_type, encrypted, order, shared):
         pos = 8 + farc_type['fixed_header_size'] + _files_header_size_calc(files, farc_type)
         
         if encrypted and farc_type['encryption_type'] == 'FT':
             pos += 16 # leave space for header IV
             if pos % 16: pos += 16 - (pos % 16) # ensure space exists for AES
         
-        for fname, info in files.items():
+        for fname in order:
+            info = files[fname]
             if pos % alignment: pos += alignment - (pos % alignment)
             info['pointer'] = pos
             pos += len(info['data']) # don't use previously obtained length because encryption might change the data size
+        
+        for fname, shared_fname in shared.items():
+            files[fname]['pointer'] = files[shared_fname]['pointer']
     
     for fname, info in files.items():
         info['len_uncompressed'] = len(info['data'])
+        if stats: stats.peak('entry_size', len(info['data']))
         
         if (not 'flags' in info) or (not farc_type['has_per_file_flags']):
             info['flags'] = {}
@@ -114,16 +153,46 @@ def _prep_files(files, alignment, farc_type, flags):
     if farc_type['encryption_type']:
         _encrypt_files(files, farc_type)
     
-    _set_files_pointers(files, alignment, farc_type, flags.get('encrypted', False))
+    order, shared = _plan_layout(files, alignment, layout)
+    _set_files_pointers(files, alignment, farc_type, flags.get('encrypted', False), order, shared)
+    return order
 
 
-def to_stream(data, stream, no_copy=False):
+def to_stream(data, stream, no_copy=False, stats=None, iv_mode=None, layout=None):
     """
     Converts a farc dictionary (formatted like the dictionary returned by from_stream) to farc data and writes it to a stream.
+    Data is written strictly in order without seeking or reading back, so stream can be a pipe, socket, etc.
     
     Set no_copy to True for a speedup and memory usage reduction if you don't mind your input data being contaminated.
+    Set stats to a pydiva.util.stats.Stats object to collect timings for each stage.
+    
+    iv_mode sets how encryption IVs are made for encrypted FT FARCs: 'random', 'null', or 'derived' (a keyed hash of
+    each file's name and data, so unchanged input gives byte-identical output). The default is 'null' if the
+    PYFARC_NULL_IV environment variable is set, otherwise 'random'.
+    
+    layout sets where files' data is placed (the files table always stays in dictionary order):
+    - None: in dictionary order
+    - 'compact': files with identical stored data share one copy, and the file needing the most alignment padding is
+      placed last (where no padding is written)
+    - a list of filenames in the order they're usually read (an access profile): listed files are placed first in that
+      order so they can be read without seeking, followed by other files in dictionary order
+    
+    Returns a dictionary describing the layout:
+    ```
+    {
+        'size': 4096,     # bytes written
+        'padding': 120,   # bytes of alignment padding written
+        'shared': 2,      # number of files sharing another file's data
+        'seeks': 3        # seeks needed to read all files after the header in access profile order (or dictionary order)
+    }
+    ```
     """
     
+    if iv_mode is not None and not iv_mode in _iv_modes:
+        raise ValueError('Unknown iv_mode {} (expected one of {})'.format(iv_mode, ', '.join(_iv_modes)))
+    if isinstance(layout, (str, bytes)) and layout != 'compact':
+        raise ValueError('Unknown layout {} (expected None, \'compact\' or a list of filenames)'.format(layout))
+    
     magic_str = data['farc_type']
     check_farc_type(magic_str)
     farc_type = _farc_types[magic_str]
@@ -150,166 +219,735 @@ def to_stream(data, stream, no_copy=False):
         raise UnsupportedFarcTypeException('Writing {} type with encryption not supported'.format(magic_str))
     
     
+    if stats: start = perf_counter()
     if no_copy:
         files = data['files']
     else:
         files = deepcopy(data['files'])
-    _prep_files(files, alignment, farc_type, flags)
+    if stats:
+        stats.add('copy', start)
+        stats.count('entries', len(files))
+    order = _prep_files(files, alignment, farc_type, flags, stats, iv_mode, layout)
     
-    if flags['encrypted'] and farc_type['encryption_type'] == 'FT':
-        og_stream = stream
-        stream = BytesIO()
+    if stats: start = perf_counter()
+    
+    header_data = dict(
+        header_size=farc_type['fixed_header_size'] + _files_header_size_calc(files, farc_type),
+        flags=flags,
+        entry_count=len(files),
+        alignment=alignment
+    )
     
     if farc_type['compression_support']:
-        farc_type['struct'].build_stream(dict(
-            header_size=farc_type['fixed_header_size'] + _files_header_size_calc(files, farc_type),
-            flags=flags,
-            entry_count=len(files),
-            alignment=alignment,
-            files=[dict(
-                name=fname,
-                pointer=info['pointer'],
-                compressed_size=info['len_compressed'],
-                uncompressed_size=info['len_uncompressed'],
-                flags=info['flags'],
-                data=info['data']
-            ) for fname, info in files.items()]
-        ), stream)
+        header = farc_type['table_struct'].build(dict(header_data, files=[dict(
+            name=fname,
+            pointer=info['pointer'],
+            compressed_size=info['len_compressed'],
+            uncompressed_size=info['len_uncompressed'],
+            flags=info['flags']
+        ) for fname, info in files.items()]))
     else:
-        farc_type['struct'].build_stream(dict(
-            header_size=farc_type['fixed_header_size'] + _files_header_size_calc(files, farc_type),
-            flags=flags,
-            entry_count=len(files),
-            alignment=alignment,
-            files=[dict(
-                name=fname,
-                pointer=info['pointer'],
-                size=info['len_uncompressed'],
-                flags=info['flags'],
-                data=info['data']
-            ) for fname, info in files.items()]
-        ), stream)
+        header = farc_type['table_struct'].build(dict(header_data, files=[dict(
+            name=fname,
+            pointer=info['pointer'],
+            size=info['len_uncompressed'],
+            flags=info['flags']
+        ) for fname, info in files.items()]))
+    
+    if stats:
+        stats.add('build', start, 0, len(header))
+        start = perf_counter()
     
     if flags['encrypted'] and farc_type['encryption_type'] == 'FT':
-        stream.seek(0)
-        _encrypt_FT_FARC_header(stream, og_stream, farc_type['encryption_key'])
-        stream.close()
+        header = _encrypt_FT_FARC_header_bytes(header, farc_type['encryption_key'], iv_mode)
+        if stats:
+            stats.add('header_encrypt', start, 0, len(header))
+            start = perf_counter()
+    
+    if stats: stats.peak('header_size', len(header))
+    
+    # write strictly in order (pointers always increase) so stream doesn't need to be seekable
+    stream.write(header)
+    pos = len(header)
+    padding = 0
+    for fname in order:
+        info = files[fname]
+        if not info['data']:
+            continue # don't pad for empty files, so there's no padding after the last file
+        stream.write(bytes(info['pointer'] - pos))
+        stream.write(info['data'])
+        padding += info['pointer'] - pos
+        pos = info['pointer'] + len(info['data'])
+    
+    if stats: stats.add('write', start, 0, pos)
+    
+    # count reads that can't continue from the end of the previous read (skipping only padding)
+    seeks = 0
+    read_pos = len(header)
+    access_order = order if isinstance(layout, (list, tuple)) else files
+    for fname in access_order:
+        info = files[fname]
+        if not info['data']:
+            continue
+        if not read_pos <= info['pointer'] < read_pos + alignment:
+            seeks += 1
+        read_pos = info['pointer'] + len(info['data'])
+    
+    return {'size': pos, 'padding': padding, 'shared': len(files) - len(order), 'seeks': seeks}
 
-def to_bytes(data, no_copy=False):
+def to_bytes(data, no_copy=False, stats=None, iv_mode=None, layout=None):
     """
     Converts a farc dictionary (formatted like the dictionary returned by from_bytes) to an in-memory bytes object containing farc data.
     
     Set no_copy to True for a speedup and memory usage reduction if you don't mind your input data being contaminated.
+    (see to_stream for iv_mode and layout)
     """
     
     with BytesIO() as s:
-        to_stream(data, s, no_copy)
+        to_stream(data, s, no_copy, stats, iv_mode, layout)
         return s.getvalue()
 
 
-def _parsed_to_dict(farcdata, farc_type, files_whitelist=None):
+def _parse_table(header, stats=None):
     """
-    Converts the raw construct data to our standard dictionary format.
-    Setting files_whitelist will return a dictionary that only contains files with names in the whitelist.
+    Parses a complete farc header (files table, starting with magic), decrypting it if needed.
+    Returns a tuple of (farc_type, parsed table).
     """
     
-    files = {}
+    if stats:
+        start = perf_counter()
+        stats.peak('header_size', len(header))
     
+    magic_str = header[:4].decode('ascii', 'replace')
+    check_farc_type(magic_str)
+    farc_type = _farc_types[magic_str]
+    
+    needs_decryption = False
+    if _is_FT_FARC_prefix(header):
+        farc_type = _farc_types['FARC_FT']
+        needs_decryption = _needs_FT_decryption_prefix(header)
+    
+    if stats:
+        stats.add('sniff', start, len(header))
+        start = perf_counter()
+    
+    if needs_decryption:
+        encrypted_size = len(header)
+        header = _decrypt_FT_FARC_header_bytes(header, farc_type['encryption_key'])
+        if stats:
+            stats.add('header_decrypt', start, encrypted_size, len(header))
+            start = perf_counter()
+    
+    parsed = farc_type['table_struct'].parse(header)
+    if stats:
+        stats.add('table_parse', start, len(header))
+        stats.count('entries', len(parsed['files']))
+    return farc_type, parsed
+
+def _read_exact(s, size):
+    """Reads exactly size bytes from a stream that may return short reads. (pipes, sockets)"""
+    
+    chunks = []
+    while size > 0:
+        chunk = s.read(size)
+        if not chunk:
+            raise EOFError("unexpected end of farc data")
+        chunks += [chunk]
+        size -= len(chunk)
+    return b''.join(chunks)
+
+def _read_table(s, stats=None):
+    """
+    Reads the entire header (files table) from stream s in one read, decrypts it if needed, and parses it without
+    seeking or reading file data.
+    Returns a tuple of (farc_type, parsed table). Stream position is restored.
+    """
+    
+    if stats: start = perf_counter()
+    pos = s.tell()
+    header = s.read(8)
+    s.seek(pos)
+    check_farc_type(header[:4].decode('ascii', 'replace')) # non-farc data may not be ascii
+    
+    s.seek(pos + 8)
+    header += _read_exact(s, int.from_bytes(header[4:8], byteorder='big', signed=False))
+    s.seek(pos)
+    if stats: stats.add('header_read', start, 0, len(header))
+    
+    return _parse_table(header, stats)
+
+def _table_to_dict(farcdata, farc_type):
+    """Converts a parsed table from _read_table to the dictionary format returned by table_from_stream."""
+    
+    archive_flags = {'encrypted': False, 'compressed': farc_type['compression_forced']}
     if farc_type['has_flags']:
-        flags = farcdata['flags']
-        
-        for f in farcdata['files']:
-            if files_whitelist and not f['name'] in files_whitelist:
-                continue
-            
-            data = f['data']
-            
-            if farc_type['has_per_file_flags']:
-                flags = f['flags']
-            
-            if flags.get('encrypted'):
-                if farc_type['encryption_type'] == 'DT':
-                    cipher = AES.new(farc_type['encryption_key'], AES.MODE_ECB)
-                    data = cipher.decrypt(data)
-                elif farc_type['encryption_type'] == 'FT':
-                    cipher = AES.new(farc_type['encryption_key'], AES.MODE_CBC, iv=data[:16])
-                    data = cipher.decrypt(data[16:])
-            
-            if flags.get('compressed') and (farc_type['compression_forced'] or (f['uncompressed_size'] != f['compressed_size'])):
-                data = zlib.decompress(data, wbits=16+zlib.MAX_WBITS, bufsize=f['uncompressed_size'])
-            else:
-                if flags.get('encrypted'): # if encrypted but not compressed, need to strip padding manually
-                    data = data[:f['uncompressed_size']]
-            
-            files[f['name']] = {'data': data}
-            if farc_type['has_per_file_flags']:
-                files[f['name']]['flags'] = dict(flags)
-                del files[f['name']]['flags']['_io']
-    
-    elif farc_type['compression_support']:
-        for f in farcdata['files']:
-            if files_whitelist and not f['name'] in files_whitelist:
-                continue
-            
-            data = f['data']
-            
-            if farc_type['compression_forced'] or (f['uncompressed_size'] != f['compressed_size']):
-                data = zlib.decompress(data, wbits=16+zlib.MAX_WBITS, bufsize=f['uncompressed_size'])
-            
-            files[f['name']] = {'data': data}
+        archive_flags = {'encrypted': farcdata['flags']['encrypted'], 'compressed': farcdata['flags']['compressed']}
     
-    else:
-        for f in farcdata['files']:
-            if files_whitelist and not f['name'] in files_whitelist:
-                continue
-            
-            data = f['data']
-            files[f['name']] = {'data': data}
+    files = {}
+    for f in farcdata['files']:
+        if farc_type['compression_support']:
+            compressed_size, uncompressed_size = f['compressed_size'], f['uncompressed_size']
+        else:
+            compressed_size = uncompressed_size = f['size']
+        
+        if farc_type['has_per_file_flags']:
+            flags = {'encrypted': f['flags']['encrypted'], 'compressed': f['flags']['compressed']}
+        else:
+            flags = dict(archive_flags)
+        
+        stored_size = compressed_size
+        if flags['encrypted'] and stored_size % 16:
+            stored_size += 16 - (stored_size % 16)
+        
+        files[f['name']] = {
+            'pointer': f['pointer'],
+            'stored_size': stored_size,
+            'compressed_size': compressed_size,
+            'uncompressed_size': uncompressed_size,
+            'flags': flags
+        }
     
     out = {'farc_type': farcdata['signature'].decode('ascii'), 'files': files, 'alignment': farcdata['alignment']}
     if farc_type['has_flags']:
-        out['flags'] = dict(farcdata['flags'])
-        del out['flags']['_io']
+        out['flags'] = archive_flags
     if farc_type['format_field']:
         out['format'] = farcdata['format']
     return out
 
-def from_stream(s, files_whitelist=None):
+def _table_farc_type(table):
+    """Gets internal farc_type data for a dictionary returned by table_from_stream."""
+    
+    farc_type = _farc_types[table['farc_type']]
+    if farc_type['format_field']:
+        farc_type = _farc_types[farc_type['format_field'][table['format']]]
+    return farc_type
+
+def _decode_file(data, info, farc_type, stats=None):
+    """Decrypts and decompresses a file's stored data, given its info from a table dictionary."""
+    
+    flags = info['flags']
+    
+    if flags['encrypted']:
+        if stats: start = perf_counter()
+        if farc_type['encryption_type'] == 'DT':
+            AES = _aes()
+            cipher = AES.new(farc_type['encryption_key'], AES.MODE_ECB)
+            data = cipher.decrypt(data)
+        elif farc_type['encryption_type'] == 'FT':
+            data = _cbc_decrypt(farc_type['encryption_key'], data[:16], memoryview(data)[16:])
+        if stats: stats.add('decrypt', start, info['stored_size'], len(data))
+    
+    if flags['compressed'] and (farc_type['compression_forced'] or (info['uncompressed_size'] != info['compressed_size'])):
+        if stats: start = perf_counter()
+        compressed_size = len(data)
+        data = zlib.decompress(data, wbits=16+zlib.MAX_WBITS, bufsize=info['uncompressed_size'])
+        if stats: stats.add('inflate', start, compressed_size, len(data))
+    elif flags['encrypted']: # if encrypted but not compressed, need to strip padding manually
+        data = bytes(memoryview(data)[:info['uncompressed_size']])
+    
+    if stats: stats.peak('entry_size', len(data))
+    return data
+
+def table_from_stream(s):
+    """
+    Reads only the files table of farc data from a stream, without reading any file data.
+    Stream position is restored, and should be the same when calling file_from_stream.
+    
+    Returns a dictionary like from_stream, except that files contain info instead of data:
+    ```
+    'filename': {
+        'pointer': 64,               # offset of stored data from start of farc
+        'stored_size': 48,           # size of stored data (including encryption IV/padding)
+        'compressed_size': 48,
+        'uncompressed_size': 100,
+        'flags': {'encrypted': False, 'compressed': True}  # effective flags for this file
+    }
+    ```
+    """
+    
+    farc_type, farcdata = _read_table(s)
+    return _table_to_dict(farcdata, farc_type)
+
+def file_from_stream(s, table, fname):
+    """
+    Reads and decodes a single file from farc data in a stream, using a table from table_from_stream.
+    Raises KeyError if the file isn't in the table. Stream position is restored.
+    """
+    
+    info = table['files'][fname]
+    
+    pos = s.tell()
+    s.seek(pos + info['pointer'])
+    data = _read_exact(s, info['stored_size'])
+    s.seek(pos)
+    
+    return _decode_file(data, info, _table_farc_type(table))
+
+def _readinto_exact(s, buffer):
+    """Fills a writable memoryview from stream s, which may return short reads."""
+    
+    pos = 0
+    while pos < len(buffer):
+        n = s.readinto(buffer[pos:])
+        if not n:
+            raise EOFError("unexpected end of farc data")
+        pos += n
+
+def _inflate_into(data, out, chunk_size=256*1024):
+    """Inflates gzip data into writable memoryview out in chunks. Returns the number of bytes written."""
+    
+    decompressor = zlib.decompressobj(wbits=16+zlib.MAX_WBITS)
+    data = memoryview(data)
+    written = 0
+    
+    # feed input in chunks too, since unconsumed_tail is a copy of all remaining input
+    for start in range(0, len(data), chunk_size):
+        tail = data[start:start + chunk_size]
+        while not decompressor.eof:
+            chunk = decompressor.decompress(tail, chunk_size)
+            tail = decompressor.unconsumed_tail
+            if written + len(chunk) > len(out):
+                raise ValueError("decompressed data is larger than uncompressed_size")
+            out[written:written + len(chunk)] = chunk
+            written += len(chunk)
+            if not tail and len(chunk) < chunk_size: # need more input
+                break
+        if decompressor.eof:
+            break
+    return written
+
+def read_entry_into(s, table, fname, buffer):
+    """
+    Reads and decodes a single file from farc data in a stream directly into a writable buffer (bytearray, memoryview,
+    mmap...) of at least the file's uncompressed_size, using a table from table_from_stream.
+    Returns the number of bytes written. Raises KeyError if the file isn't in the table. Stream position is restored.
+    
+    Unencrypted data is read straight into buffer, encrypted data is decrypted into it, and compressed data is inflated
+    into it in chunks, so no bytes object is created for the whole file.
+    """
+    
+    info = table['files'][fname]
+    farc_type = _table_farc_type(table)
+    flags = info['flags']
+    size = info['uncompressed_size']
+    compressed = flags['compressed'] and (farc_type['compression_forced'] or (size != info['compressed_size']))
+    
+    out = memoryview(buffer).cast('B')
+    if len(out) < size:
+        raise ValueError("buffer is too small for {} ({} < {} bytes)".format(fname, len(out), size))
+    out = out[:size]
+    
+    pos = s.tell()
+    s.seek(pos + info['pointer'])
+    try:
+        if not flags['encrypted'] and not compressed:
+            _readinto_exact(s, out)
+            return size
+        
+        stored = memoryview(bytearray(info['stored_size']))
+        _readinto_exact(s, stored)
+    finally:
+        s.seek(pos)
+    
+    if flags['encrypted']:
+        key = farc_type['encryption_key']
+        if farc_type['encryption_type'] == 'DT':
+            AES = _aes()
+            cipher = AES.new(key, AES.MODE_ECB)
+            decrypt = lambda data, output, iv: cipher.decrypt(data, output=output)
+            iv = None
+        elif farc_type['encryption_type'] == 'FT':
+            decrypt = lambda data, output, iv: _cbc_decrypt(key, iv, data, output=output)
+            iv = bytes(stored[:16])
+            stored = stored[16:]
+        
+        if not compressed:
+            # decrypt whole blocks straight into buffer, then copy what's needed from the last (padded) block
+            whole = size - size % 16
+            decrypt(stored[:whole], out[:whole], iv)
+            if whole < size:
+                last = bytearray(16)
+                decrypt(stored[whole:whole + 16], last, bytes(stored[whole - 16:whole]) if whole else iv)
+                out[whole:] = last[:size - whole]
+            return size
+        
+        decrypt(stored, stored, iv)
+    
+    written = _inflate_into(stored, out)
+    if written != size:
+        raise zlib.error("decompressed size {} doesn't match uncompressed_size {}".format(written, size))
+    return written
+
+def from_stream(s, files_whitelist=None, stats=None):
     """
     Converts farc data from a stream to a dictionary.
     Setting files_whitelist will return a dictionary that only contains files with names in the whitelist.
+    Set stats to a pydiva.util.stats.Stats object to collect timings for each stage.
     """
     
+    farc_type, farcdata = _read_table(s, stats)
+    table = _table_to_dict(farcdata, farc_type)
+    
+    names = [fname for fname in table['files'] if not files_whitelist or fname in files_whitelist]
+    
+    # read in pointer order, only seeking when files aren't contiguous
+    if stats: start = perf_counter()
     pos = s.tell()
-    magic_str = s.read(4).decode('ascii')
+    stored_data = {}
+    for fname in sorted(names, key=lambda fname: table['files'][fname]['pointer']):
+        info = table['files'][fname]
+        if s.tell() != pos + info['pointer']:
+            s.seek(pos + info['pointer'])
+        stored_data[fname] = _read_exact(s, info['stored_size'])
     s.seek(pos)
-    check_farc_type(magic_str)
-    farc_type = _farc_types[magic_str]
+    if stats: stats.add('read', start, 0, sum(len(data) for data in stored_data.values()))
     
-    close_ft_stream = False
-    if _is_FT_FARC(s):
-        farc_type = _farc_types['FARC_FT']
-        decrypt_stream = _decrypt_FT_FARC_header(s, farc_type['encryption_key'])
-        if decrypt_stream:
-            s = decrypt_stream
-            close_ft_stream = True
+    files = {}
+    for fname in names:
+        info = table['files'][fname]
+        files[fname] = {'data': _decode_file(stored_data.pop(fname), info, farc_type, stats)}
+        if farc_type['has_per_file_flags']:
+            files[fname]['flags'] = dict(info['flags'])
     
-    farcdata = farc_type['struct'].parse_stream(s)
+    table['files'] = files
+    return table
+
+def iter_from_stream(s, files_whitelist=None, skip_chunk_size=1024*1024):
+    """
+    Reads farc data from a stream strictly forwards, without seeking, yielding tuples of (filename, bytes) in the order
+    files are stored.
+    Works with non-seekable streams like pipes, sockets and tar members. Only the header and one file are held in
+    memory at a time (plus up to skip_chunk_size bytes when skipping data that isn't needed).
+    Setting files_whitelist will only yield files with names in the whitelist.
+    
+    Raises ValueError if the archive has file data that isn't stored in forward order.
+    """
     
-    if close_ft_stream: # explicitly close BytesIO from FT decryption if one was opened
-        s.close()
+    header = _read_exact(s, 8)
+    check_farc_type(header[:4].decode('ascii', 'replace')) # non-farc data may not be ascii
+    header += _read_exact(s, int.from_bytes(header[4:8], byteorder='big', signed=False))
     
-    return _parsed_to_dict(farcdata, farc_type, files_whitelist)
+    farc_type, farcdata = _parse_table(header)
+    table = _table_to_dict(farcdata, farc_type)
+    
+    names = [fname for fname in table['files'] if not files_whitelist or fname in files_whitelist]
+    
+    pos = len(header)
+    last = (None, None) # (pointer, stored data) of last read, for files sharing data
+    for fname in sorted(names, key=lambda fname: table['files'][fname]['pointer']):
+        info = table['files'][fname]
+        
+        if not info['stored_size']: # may point past the end of data (no padding after last file)
+            data = b''
+        elif info['pointer'] == last[0]:
+            data = last[1]
+        else:
+            if info['pointer'] < pos:
+                raise ValueError("{} data is before current position in stream".format(fname))
+            
+            while pos < info['pointer']:
+                pos += len(_read_exact(s, min(skip_chunk_size, info['pointer'] - pos)))
+            
+            data = _read_exact(s, info['stored_size'])
+            pos += len(data)
+            last = (info['pointer'], data)
+        
+        yield (fname, _decode_file(data, info, farc_type))
 
-def from_bytes(b, files_whitelist=None):
+def from_bytes(b, files_whitelist=None, stats=None):
     """
     Converts farc data from bytes to a dictionary.
     Setting files_whitelist will return a dictionary that only contains files with names in the whitelist.
     """
     
     with BytesIO(b) as s:
-        return from_stream(s, files_whitelist)
+        return from_stream(s, files_whitelist, stats)
+
+
+
+def _verify_file(path, info, farc_type, hash_name, chunk_size):
+    """Decodes a single file from the farc at path in chunks to check it. Returns a report dict. (see verify)"""
+    
+    import hashlib
+    
+    flags = info['flags']
+    compressed = flags['compressed'] and (farc_type['compression_forced'] or (info['uncompressed_size'] != info['compressed_size']))
+    
+    errors = []
+    size = 0
+    h = hashlib.new(hash_name) if hash_name else None
+    cipher = None
+    decompressor = zlib.decompressobj(wbits=16+zlib.MAX_WBITS) if compressed else None
+    
+    def _output(data):
+        nonlocal size
+        size += len(data)
+        if h:
+            h.update(data)
+    
+    with open(path, 'rb') as f:
+        f.seek(info['pointer'])
+        remaining = info['stored_size']
+        
+        try:
+            if flags['encrypted']:
+                AES = _aes()
+                if farc_type['encryption_type'] == 'DT':
+                    cipher = AES.new(farc_type['encryption_key'], AES.MODE_ECB)
+                elif farc_type['encryption_type'] == 'FT':
+                    cipher = AES.new(farc_type['encryption_key'], AES.MODE_CBC, iv=f.read(16))
+                    remaining -= 16
+            
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    errors += ['stored data is truncated']
+                    break
+                remaining -= len(chunk)
+                
+                if cipher:
+                    chunk = cipher.decrypt(chunk)
+                
+                if not decompressor:
+                    _output(chunk[:info['uncompressed_size'] - size]) # strip encryption padding
+                    continue
+                
+                # limit output size so memory use doesn't depend on compression ratio
+                while not decompressor.eof:
+                    out = decompressor.decompress(chunk, chunk_size)
+                    chunk = decompressor.unconsumed_tail
+                    if not out and not chunk:
+                        break
+                    _output(out)
+        except (ValueError, zlib.error) as e: # zlib checks gzip CRC32 and ISIZE trailer
+            errors += ['can\'t decode data: {}'.format(e)]
+    
+    if decompressor and not decompressor.eof and not errors:
+        errors += ['compressed data is truncated (no gzip trailer)']
+    if size != info['uncompressed_size'] and not errors:
+        errors += ['decoded size {} doesn\'t match uncompressed_size {}'.format(size, info['uncompressed_size'])]
+    
+    return {'ok': not errors, 'errors': errors, 'size': size, 'hash': h.hexdigest() if h else None}
+
+def verify(path, workers=4, hash_name=None, chunk_size=1024*1024):
+    """
+    Checks the integrity of the farc at path without loading whole files into memory.
+    
+    Checks that file data is within the archive, after the header, aligned, and doesn't overlap (except for files
+    sharing identical data). Then each file is decrypted and decompressed in chunks of chunk_size bytes (using a thread pool of workers), checking the gzip
+    CRC32/ISIZE trailer and uncompressed_size. chunk_size is rounded up to a multiple of the 16 byte AES block size.
+    Set hash_name to a hashlib algorithm name (eg. 'sha256') to include a hash of each decoded file.
+    
+    Returns a dictionary:
+    ```
+    {
+        'ok': False,                 # True if no problems were found
+        'errors': [...],             # archive-level problem descriptions
+        'files': {
+            'filename': {'ok': False, 'errors': [...], 'size': 100, 'hash': None}  # size of decoded data
+        }
+    }
+    ```
+    Raises UnsupportedFarcTypeException if path is not a supported farc.
+    """
+    
+    from concurrent.futures import ThreadPoolExecutor
+    
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    chunk_size += -chunk_size % 16 # encrypted chunks must be whole AES blocks
+    
+    with open(path, 'rb') as f:
+        farc_type, farcdata = _read_table(f)
+        header_end = 8 + int.from_bytes(f.read(8)[4:8], byteorder='big', signed=False) # size on disk (may be encrypted)
+        file_size = f.seek(0, 2)
+    
+    table = _table_to_dict(farcdata, farc_type)
+    
+    errors = []
+    file_errors = {fname: [] for fname in table['files']}
+    
+    if table['alignment'] < 1:
+        errors += ['bad alignment {}'.format(table['alignment'])]
+    
+    prev = None
+    for fname, info in sorted(table['files'].items(), key=lambda f: f[1]['pointer']):
+        if not info['stored_size']:
+            continue
+        if info['pointer'] < header_end:
+            file_errors[fname] += ['data starts inside header']
+        if info['pointer'] + info['stored_size'] > file_size:
+            file_errors[fname] += ['data ends after end of archive']
+        if table['alignment'] > 0 and info['pointer'] % table['alignment']:
+            file_errors[fname] += ['data is not aligned to {}'.format(table['alignment'])]
+        if prev and info['pointer'] < prev[1]['pointer'] + prev[1]['stored_size']:
+            if (info['pointer'], info['stored_size']) == (prev[1]['pointer'], prev[1]['stored_size']):
+                continue # files can share identical data
+            file_errors[fname] += ['data overlaps {}'.format(prev[0])]
+        prev = (fname, info)
+    
+    # don't try decoding files with bad bounds
+    names = [fname for fname in table['files'] if not file_errors[fname]]
+    if workers <= 1:
+        files = {fname: _verify_file(path, table['files'][fname], farc_type, hash_name, chunk_size) for fname in names}
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            reports = executor.map(lambda fname: _verify_file(path, table['files'][fname], farc_type, hash_name, chunk_size), names)
+            files = dict(zip(names, reports))
+    
+    for fname in table['files']:
+        if file_errors[fname]:
+            files[fname] = {'ok': False, 'errors': file_errors[fname], 'size': None, 'hash': None}
+    
+    files = {fname: files[fname] for fname in table['files']}
+    return {'ok': not errors and all(r['ok'] for r in files.values()), 'errors': errors, 'files': files}
+
+def _stored_equal(fa, info_a, fb, info_b, chunk_size):
+    """Compares stored (raw) data of two files in chunks, stopping at the first difference."""
+    
+    if info_a['stored_size'] != info_b['stored_size']:
+        return False
+    
+    fa.seek(info_a['pointer'])
+    fb.seek(info_b['pointer'])
+    remaining = info_a['stored_size']
+    while remaining > 0:
+        a, b = fa.read(min(chunk_size, remaining)), fb.read(min(chunk_size, remaining))
+        if a != b:
+            return False
+        if not a:
+            break
+        remaining -= len(a)
+    return True
+
+def _gzip_trailer(f, info, farc_type):
+    """
+    Gets the gzip trailer (CRC32 and ISIZE) of a compressed file by reading and decrypting only the end of its
+    stored data. Returns None if it can't be read.
+    """
+    
+    if info['compressed_size'] < 8:
+        return None
+    
+    end = info['pointer'] + info['stored_size']
+    try:
+        AES = _aes() if info['flags']['encrypted'] else None
+        if not info['flags']['encrypted']:
+            f.seek(end - 8)
+            trailer = f.read(8)
+        elif farc_type['encryption_type'] == 'DT':
+            # ECB blocks are independent, and padding after compressed data is zeros
+            start = info['pointer'] + (info['compressed_size'] - 8) // 16 * 16
+            f.seek(start)
+            tail = AES.new(farc_type['encryption_key'], AES.MODE_ECB).decrypt(f.read(end - start))
+            trailer = tail[info['pointer'] + info['compressed_size'] - 8 - start:][:8]
+        elif farc_type['encryption_type'] == 'FT':
+            # last two blocks always hold the trailer (at most 16 bytes of padding) -- the block before them is their IV
+            if info['stored_size'] < 48:
+                return None
+            from Cryptodome.Util.Padding import unpad
+            f.seek(end - 48)
+            tail = f.read(48)
+            tail = unpad(AES.new(farc_type['encryption_key'], AES.MODE_CBC, iv=tail[:16]).decrypt(tail[16:]), 16, 'pkcs7')
+            trailer = tail[-8:]
+        else:
+            return None
+    except ValueError:
+        return None
+    
+    return trailer if len(trailer) == 8 else None
+
+def _diff_file(path_a, fa, info_a, farc_type_a, path_b, fb, info_b, farc_type_b, chunk_size):
+    """Returns whether two files have the same content, decoding them only if needed. (see diff)"""
+    
+    if info_a['uncompressed_size'] != info_b['uncompressed_size']:
+        return False
+    
+    compressed_a = info_a['flags']['compressed'] and (farc_type_a['compression_forced'] or (info_a['uncompressed_size'] != info_a['compressed_size']))
+    compressed_b = info_b['flags']['compressed'] and (farc_type_b['compression_forced'] or (info_b['uncompressed_size'] != info_b['compressed_size']))
+    encryption_a = farc_type_a['encryption_type'] if info_a['flags']['encrypted'] else None
+    encryption_b = farc_type_b['encryption_type'] if info_b['flags']['encrypted'] else None
+    same_encoding = compressed_a == compressed_b and encryption_a == encryption_b
+    
+    if same_encoding and _stored_equal(fa, info_a, fb, info_b, chunk_size):
+        return True
+    
+    # without compression or random IVs, the same content is always stored the same way
+    if same_encoding and not compressed_a and encryption_a != 'FT':
+        return False
+    
+    # different gzip CRC32 or size means different content
+    if compressed_a and compressed_b:
+        trailer_a, trailer_b = _gzip_trailer(fa, info_a, farc_type_a), _gzip_trailer(fb, info_b, farc_type_b)
+        if trailer_a and trailer_b and trailer_a != trailer_b:
+            return False
+    
+    report_a = _verify_file(path_a, info_a, farc_type_a, 'sha256', chunk_size)
+    report_b = _verify_file(path_b, info_b, farc_type_b, 'sha256', chunk_size)
+    return report_a['ok'] and report_b['ok'] and report_a['hash'] == report_b['hash']
 
+def diff(a, b, chunk_size=1024*1024):
+    """
+    Compares the files in farcs at paths a (old) and b (new) without loading whole files into memory.
+    
+    Files are compared by stored (compressed/encrypted) data first, which is enough for most files. Files are only
+    decoded (in chunks of chunk_size bytes) if their stored data differs but their content could still be the same,
+    eg. encrypted with different IVs or compressed differently. For compressed files, the gzip CRC32 is checked first so
+    most changed files aren't decoded either.
+    
+    Returns a dictionary of lists of filenames:
+    ```
+    {
+        'added': [...],      # only in b
+        'removed': [...],    # only in a
+        'changed': [...],    # in both with different content (or can't be decoded)
+        'unchanged': [...]   # in both with the same content
+    }
+    ```
+    Raises UnsupportedFarcTypeException if a or b is not a supported farc.
+    """
+    
+    out = {'added': [], 'removed': [], 'changed': [], 'unchanged': []}
+    
+    with open(a, 'rb') as fa, open(b, 'rb') as fb:
+        farc_type_a, table_a = _read_table(fa)
+        farc_type_b, table_b = _read_table(fb)
+        table_a, table_b = _table_to_dict(table_a, farc_type_a), _table_to_dict(table_b, farc_type_b)
+        farc_type_a, farc_type_b = _table_farc_type(table_a), _table_farc_type(table_b)
+        
+        for fname, info in table_a['files'].items():
+            if not fname in table_b['files']:
+                out['removed'] += [fname]
+            elif _diff_file(a, fa, info, farc_type_a, b, fb, table_b['files'][fname], farc_type_b, chunk_size):
+                out['unchanged'] += [fname]
+            else:
+                out['changed'] += [fname]
+        
+        out['added'] = [fname for fname in table_b['files'] if not fname in table_a['files']]
+    
+    return out
+
+def diff_many(pairs, workers=8, chunk_size=1024*1024):
+    """
+    Takes an iterable of (path a, path b) pairs and compares each pair like diff, using a thread pool.
+    This is a generator that yields tuples of (pair index, diff result) as each pair finishes, so results may not be
+    in pair order. If a pair can't be compared, the result is the exception instead.
+    """
+    
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    
+    pairs = list(pairs)
+    
+    def _diff(pair):
+        try:
+            return diff(pair[0], pair[1], chunk_size)
+        except Exception as e:
+            return e
+    
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {executor.submit(_diff, pair): i for i, pair in enumerate(pairs)}
+        for future in as_completed(futures):
+            yield (futures[future], future.result())
 
 #test_farc = {'farc_type': 'FArc', 'files': {'aaa': {'data': b'test1'}, 'bbb': {'data': b'test2'}, 'ccc': {'data': b'aaaaaaaaaaaaaaaaaaaaaaaa'}}, 'alignment': 16}
 #test_farc = {'farc_type': 'FArC', 'files': {'aaa': {'data': b'test1'}, 'bbb': {'data': b'test2'}, 'ccc': {'data': b'aaaaaaaaaaaaaaaaaaaaaaaa'}}, 'alignment': 8}
@@ -352,8 +990,20 @@ def from_bytes(b, files_whitelist=None):
 def _main(args):
     """main func for command line"""
     
-    from os.path import dirname, exists as pathexists, isfile, splitext, join as joinpath, basename
-    from os import listdir, makedirs, remove as removefile, environ
+    from os.path import exists as pathexists, isfile, splitext, join as joinpath, basename
+    from os import listdir, makedirs, remove as removefile
+    from fnmatch import fnmatch
+    from pydiva.util.stats import Stats
+    
+    stats = Stats() if args.stats else None
+    filtered = bool(args.include or args.exclude)
+    
+    def matches_filters(fname):
+        if args.include and not any(fnmatch(fname, pattern) for pattern in args.include):
+            return False
+        if args.exclude and any(fnmatch(fname, pattern) for pattern in args.exclude):
+            return False
+        return True
     
     if not args.input:
         if not args.silent: print ('No input specified.')
@@ -363,6 +1013,73 @@ def _main(args):
         if not args.silent: print ('Can\'t find file or directory "{}"'.format(args.input))
         exit(1)
     
+    if args.verify:
+        if not isfile(args.input):
+            if not args.silent: print ('Can\'t verify "{}" because it\'s a directory.'.format(args.input))
+            exit(1)
+        
+        if not args.silent: print ('Verifying "{}"'.format(args.input))
+        
+        report = verify(args.input)
+        
+        if not args.silent:
+            for err in report['errors']:
+                print (err)
+            for fname, info in report['files'].items():
+                for err in info['errors']:
+                    print ('{}: {}'.format(fname, err))
+            print ('{} files OK'.format(len(report['files'])) if report['ok'] else 'Verification failed')
+        
+        exit(0 if report['ok'] else 1)
+    
+    if args.list:
+        if not isfile(args.input):
+            if not args.silent: print ('Can\'t list "{}" because it\'s a directory.'.format(args.input))
+            exit(1)
+        
+        with open(args.input, 'rb') as f:
+            table = table_from_stream(f)
+        
+        print ('{:>12} {:>12}  {:<5} {}'.format('size', 'stored', 'flags', 'name'))
+        for fname, info in table['files'].items():
+            if not matches_filters(fname):
+                continue
+            flags = ('c' if info['flags']['compressed'] else '-') + ('e' if info['flags']['encrypted'] else '-')
+            print ('{:>12} {:>12}  {:<5} {}'.format(info['uncompressed_size'], info['stored_size'], flags, fname))
+        return
+    
+    if args.diff:
+        if not pathexists(args.diff) or isfile(args.input) != isfile(args.diff):
+            if not args.silent: print ('Can\'t compare "{}" with "{}" (both must be farc files or both directories).'.format(args.input, args.diff))
+            exit(1)
+        
+        # compare farcs with the same names in both directories
+        if isfile(args.input):
+            pairs = [('', args.input, args.diff)]
+            different = False
+        else:
+            names_a, names_b = set(listdir(args.input)), set(listdir(args.diff))
+            pairs = [(name + '/', joinpath(args.input, name), joinpath(args.diff, name)) for name in sorted(names_a & names_b) if isfile(joinpath(args.input, name))]
+            lines = ['D {}'.format(name) for name in sorted(names_a - names_b)] + ['A {}'.format(name) for name in sorted(names_b - names_a)]
+            if not args.silent:
+                for line in lines:
+                    print (line)
+            different = bool(lines)
+        
+        for i, result in diff_many([(a, b) for prefix, a, b in pairs]):
+            prefix = pairs[i][0]
+            if isinstance(result, Exception):
+                different = True
+                if not args.silent: print ('! {}: {}'.format(prefix[:-1] or pairs[i][1], result))
+                continue
+            for status, key in [('D', 'removed'), ('A', 'added'), ('M', 'changed')]:
+                for fname in result[key]:
+                    if matches_filters(fname):
+                        different = True
+                        if not args.silent: print ('{} {}{}'.format(status, prefix, fname))
+        
+        exit(1 if different else 0)
+    
     if isfile(args.input):
         def clean_dir(d):
             files = listdir(d)
@@ -372,7 +1089,15 @@ def _main(args):
         if not args.silent: print ('Extracting "{}" to directory'.format(args.input))
         
         with open(args.input, 'rb') as f:
-            farc = from_stream(f)
+            if filtered:
+                # only read and decode matching files
+                names = [fname for fname in table_from_stream(f)['files'] if matches_filters(fname)]
+                if not names:
+                    if not args.silent: print ('No files match the include/exclude patterns.')
+                    return
+                farc = from_stream(f, files_whitelist=names, stats=stats)
+            else:
+                farc = from_stream(f, stats=stats)
         
         out_dir = args.input
         while '.' in basename(out_dir):
@@ -385,13 +1110,16 @@ def _main(args):
             if isfile(out_dir):
                 if not args.silent: print ('Can\'t output because "{}" is a file, not a directory.'.format(out_dir))
                 exit(1)
-            clean_dir(out_dir)
+            if not filtered: # only overwrite matching files when extracting selectively
+                clean_dir(out_dir)
         else:
             makedirs(out_dir)
         
+        if stats: start = perf_counter()
         for fname, info in farc['files'].items():
             with open(joinpath(out_dir, fname), 'wb') as f:
                 f.write(info['data'])
+        if stats: stats.add('write', start, 0, sum(len(info['data']) for info in farc['files'].values()))
             
     else:
         if not args.silent: print ('Building farc from directory "{}"'.format(args.input))
@@ -408,6 +1136,8 @@ def _main(args):
         }
         
         for fname in listdir(args.input):
+            if not matches_filters(fname):
+                continue
             with open(joinpath(args.input, fname), 'rb') as f: 
                 farc['files'][fname] = {'data': f.read()}
         
@@ -425,18 +1155,16 @@ def _main(args):
                 if not args.silent: print ('Can\'t output because "{}" is a directory, not a file.'.format(out_path))
                 exit(1)
         
-        if args.null_iv:
-            environ['PYFARC_NULL_IV'] = '1'
-        elif 'PYFARC_NULL_IV' in environ:
-            del environ['PYFARC_NULL_IV']
+        iv_mode = 'null' if args.null_iv else (args.iv_mode or 'random')
         
         with open(out_path, 'wb') as f:
-            to_stream(farc, f)
+            to_stream(farc, f, stats=stats, iv_mode=iv_mode)
+    
+    if stats:
+        print (stats)
 
 
 if __name__ == '__main__':
-    from os.path import dirname, exists as pathexists, isfile, splitext, join as joinpath, basename
-    from os import listdir, makedirs, remove as removefile, environ
     import argparse
     
     def get_args():
@@ -447,8 +1175,15 @@ if __name__ == '__main__':
         parser.add_argument('-e', '--encrypt', action='store_true', help='encrypt output (only for FARC, FARC_FT types)')
         parser.add_argument('-a', '--alignment', default='16', help='output farc alignment')
         parser.add_argument('--null_iv', action='store_true', help='use null encryption IVs (only for encrypted FARC_FT)')
+        parser.add_argument('--iv_mode', choices=['random', 'null', 'derived'], help='how encryption IVs are made (only for encrypted FARC_FT, default random) -- derived gives identical output for unchanged input')
         parser.add_argument('-f', '--force', action='store_true', help='force overwrite existing files/directories')
         parser.add_argument('-s', '--silent', action='store_true', help='disable command line output')
+        parser.add_argument('--verify', action='store_true', help='check integrity of input farc instead of extracting it')
+        parser.add_argument('--stats', action='store_true', help='print timings for each processing stage')
+        parser.add_argument('--diff', metavar='OTHER', help='compare input farc with farc OTHER (or farcs with the same names in two directories) instead of extracting')
+        parser.add_argument('-l', '--list', action='store_true', help='list files in input farc without extracting (only reads the files table)')
+        parser.add_argument('--include', action='append', metavar='GLOB', help='only extract/list/pack files matching this pattern (can be repeated)')
+        parser.add_argument('--exclude', action='append', metavar='GLOB', help='skip files matching this pattern (can be repeated)')
         parser.add_argument('input', default=None, help='input farc to extract or directory to archive')
 
         return parser.parse_args()
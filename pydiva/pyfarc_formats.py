@@ -2,109 +2,128 @@
 Farc format information for pyfarc
 """
 
-_construct_version = None
-try:
-    from construct import __version__ as _construct_version
-    _construct_version = [int(v) for v in _construct_version.split('.')]
-except Exception:
-    # I'd rather just continue than throw an error if this fails for some reason, like versioning changes,
-    # so just let _construct_version be None
-    # Users following instructions should never have a low version anyway
-    pass
+from pydiva.util.lazy_formats import import_construct, LazyFormat
 
-if _construct_version:
-    if (_construct_version[0] < 2) or ((_construct_version[0] == 2) and (_construct_version[1] < 9)):
-        raise Exception('Construct version too low, please install version 2.9+')
+def _gen_farc_formats(header_fields, file_fields, files_done):
+    """
+    Generates a table-only struct (stops after the files table, so parsing never seeks) from lists of fields.
+    File data is read and written by pyfarc in pointer order rather than through the struct.
+    Returns a dictionary of table_struct (for LazyFormat).
+    """
+    
+    from construct import Struct, RepeatUntil
+    
+    return {
+        'table_struct': Struct(*header_fields, "files" / RepeatUntil(files_done, Struct(*file_fields)))
+    }
 
-from construct import Struct, Const, Int32ub, Int32sb, RepeatUntil, CString, Pointer, Bytes, Padding, BitStruct, Flag, IfThenElse, Seek, Tell
+# structs are generated on first use of each type, so importing doesn't need construct
 
-_FArc_format = Struct(
-    "signature" / Const(b'FArc'),
-    "header_size" / Int32ub, # doesn't include signature or header_size
-    "alignment" / Int32sb,
-    "files" / RepeatUntil(lambda obj,lst,ctx: ctx._io.tell() - 7 > ctx.header_size, Struct(
-        "name" / CString("utf8"),
-        "pointer" / Int32ub,
-        "size" / Int32ub,
-        "data" / Pointer(lambda this: this.pointer, Bytes(lambda this: this.size))
-    )),
-    #Padding(lambda this: this.alignment - (this._io.tell() % this.alignment) if this._io.tell() % this.alignment else 0)
-)
+def _gen_FArc_formats():
+    from construct import Const, Int32ub, Int32sb, CString
+    
+    return _gen_farc_formats(
+        [
+            "signature" / Const(b'FArc'),
+            "header_size" / Int32ub, # doesn't include signature or header_size
+            "alignment" / Int32sb,
+        ],
+        [
+            "name" / CString("utf8"),
+            "pointer" / Int32ub,
+            "size" / Int32ub,
+        ],
+        lambda obj,lst,ctx: ctx._io.tell() - 7 > ctx.header_size
+    )
 
-_FArC_format = Struct(
-    "signature" / Const(b'FArC'),
-    "header_size" / Int32ub, # doesn't include signature or header_size
-    "alignment" / Int32sb,
-    "files" / RepeatUntil(lambda obj,lst,ctx: ctx._io.tell() - 7 > ctx.header_size, Struct(
-        "name" / CString("utf8"),
-        "pointer" / Int32ub,
-        "compressed_size" / Int32ub,
-        "uncompressed_size" / Int32ub,
-        "data" / Pointer(lambda this: this.pointer, Bytes(lambda this: this.compressed_size))
-    )),
-    #Padding(lambda this: this.alignment - (this._io.tell() % this.alignment) if this._io.tell() % this.alignment else 0)
-)
+def _gen_FArC_formats():
+    from construct import Const, Int32ub, Int32sb, CString
+    
+    return _gen_farc_formats(
+        [
+            "signature" / Const(b'FArC'),
+            "header_size" / Int32ub, # doesn't include signature or header_size
+            "alignment" / Int32sb,
+        ],
+        [
+            "name" / CString("utf8"),
+            "pointer" / Int32ub,
+            "compressed_size" / Int32ub,
+            "uncompressed_size" / Int32ub,
+        ],
+        lambda obj,lst,ctx: ctx._io.tell() - 7 > ctx.header_size
+    )
 
-_FARC_format = Struct(
-    "signature" / Const(b'FARC'),
-    "header_size" / Int32ub, # doesn't include signature or header_size
-    "flags" / BitStruct(
-        Padding(29),
-        "encrypted" / Flag,
-        "compressed" / Flag,
-        Padding(1)
-    ),
-    Padding(4),                     # if not encrypted or else popcnt of alignment is 1, use format field
-    "alignment" / Int32sb,          # (if is encrypted and popcnt of alignment is not 1, assume FT format)
-    "format" / Const(0, Int32sb),   # this struct only supports DT
-    Padding(4),
-    "files" / RepeatUntil(lambda obj,lst,ctx: ctx._io.tell() - 7 > ctx.header_size, Struct(
-        "name" / CString("utf8"),
-        "pointer" / Int32ub,
-        "compressed_size" / Int32ub,
-        "uncompressed_size" / Int32ub,
-        "data" / Pointer(lambda this: this.pointer, Bytes(lambda this: (this.compressed_size + 16 - (this.compressed_size % 16)) if (this.compressed_size % 16 and this._.flags.encrypted) else (this.compressed_size)))
-    )),
-    #Padding(lambda this: this.alignment - (this._io.tell() % this.alignment) if this._io.tell() % this.alignment else 0)
-)
+def _gen_FARC_formats():
+    from construct import Const, Int32ub, Int32sb, CString, Padding, BitStruct, Flag
+    
+    return _gen_farc_formats(
+        [
+            "signature" / Const(b'FARC'),
+            "header_size" / Int32ub, # doesn't include signature or header_size
+            "flags" / BitStruct(
+                Padding(29),
+                "encrypted" / Flag,
+                "compressed" / Flag,
+                Padding(1)
+            ),
+            Padding(4),                     # if not encrypted or else popcnt of alignment is 1, use format field
+            "alignment" / Int32sb,          # (if is encrypted and popcnt of alignment is not 1, assume FT format)
+            "format" / Const(0, Int32sb),   # this struct only supports DT
+            Padding(4),
+        ],
+        [
+            "name" / CString("utf8"),
+            "pointer" / Int32ub,
+            "compressed_size" / Int32ub,
+            "uncompressed_size" / Int32ub,
+        ],
+        lambda obj,lst,ctx: ctx._io.tell() - 7 > ctx.header_size
+    )
 
-_FARC_FT_format = Struct(
-    "signature" / Const(b'FARC'),
-    "header_size" / Int32ub, # doesn't include signature or header_size
-    "flags" / BitStruct(
-        Padding(29),
-        "encrypted" / Flag,
-        "compressed" / Flag,
-        Padding(1)
-    ),
-    Padding(4),                     # if not encrypted or else popcnt of alignment is 1, use format field
-    "alignment" / Int32sb,          # (if is encrypted and popcnt of alignment is not 1, assume FT format)
-    "format" / Const(1, Int32sb),   # this struct only supports FT with unencrypted header
-    "entry_count" / Int32sb,
-    IfThenElse(lambda this: this._parsing, Padding(4), Const(16, Int32sb)),
-    "files" / RepeatUntil(lambda obj,lst,ctx: (ctx._io.tell() - 7 > ctx.header_size) or (ctx._index >= ctx.entry_count-1), Struct(
-        "name" / CString("utf8"),
-        "pointer" / Int32ub,
-        "compressed_size" / Int32ub,
-        "uncompressed_size" / Int32ub,
-        "flags" / BitStruct(
-            Padding(29),
-            "encrypted" / Flag,
-            "compressed" / Flag,
-            Padding(1)
-        ),
-        "io_pos" / Tell, # save stream position
-        "file_end" / IfThenElse(lambda this: this._parsing, Seek(lambda this: this._io.seek(0, 2)), Seek(0x7fffffff)), # dirty trick using Seek for end of file when parsing and max int for building
-        Seek(lambda this: this.io_pos), # restore position
-        "data" / Pointer(lambda this: this.pointer, Bytes(lambda this: (this.compressed_size + 16 - (this.compressed_size % 16)) if (this.compressed_size % 16 and this.flags.encrypted) else (this.compressed_size)))
-    )),
-    #Padding(lambda this: this.alignment - (this._io.tell() % this.alignment) if this._io.tell() % this.alignment else 0)
-)
+def _gen_FARC_FT_formats():
+    from construct import Const, Int32ub, Int32sb, CString, Padding, BitStruct, Flag, IfThenElse
+    
+    return _gen_farc_formats(
+        [
+            "signature" / Const(b'FARC'),
+            "header_size" / Int32ub, # doesn't include signature or header_size
+            "flags" / BitStruct(
+                Padding(29),
+                "encrypted" / Flag,
+                "compressed" / Flag,
+                Padding(1)
+            ),
+            Padding(4),                     # if not encrypted or else popcnt of alignment is 1, use format field
+            "alignment" / Int32sb,          # (if is encrypted and popcnt of alignment is not 1, assume FT format)
+            "format" / Const(1, Int32sb),   # this struct only supports FT with unencrypted header
+            "entry_count" / Int32sb,
+            IfThenElse(lambda this: this._parsing, Padding(4), Const(16, Int32sb)),
+        ],
+        [
+            "name" / CString("utf8"),
+            "pointer" / Int32ub,
+            "compressed_size" / Int32ub,
+            "uncompressed_size" / Int32ub,
+            "flags" / BitStruct(
+                Padding(29),
+                "encrypted" / Flag,
+                "compressed" / Flag,
+                Padding(1)
+            ),
+        ],
+        lambda obj,lst,ctx: (ctx._io.tell() - 7 > ctx.header_size) or (ctx._index >= ctx.entry_count-1)
+    )
+
+def _lazy_farc_format(info, builder):
+    def _build():
+        import_construct()
+        return builder()
+    return LazyFormat(info, _build, ('table_struct',))
 
 _farc_types = {
-    'FArc': {
+    'FArc': _lazy_farc_format({
         'remarks': 'basic farc format',
-        'struct': _FArc_format,
         'compression_support': False,
         'compression_forced': False,
         'fixed_header_size': 4,
@@ -115,10 +134,9 @@ _farc_types = {
         'write_support': True,
         'encryption_write_support': False,
         'format_field': None,
-    },
-    'FArC': {
+    }, _gen_FArc_formats),
+    'FArC': _lazy_farc_format({
         'remarks': 'farc with compression support',
-        'struct': _FArC_format,
         'compression_support': True,
         'compression_forced': True,
         'fixed_header_size': 4,
@@ -129,10 +147,9 @@ _farc_types = {
         'write_support': True,
         'encryption_write_support': False,
         'format_field': None,
-    },
-    'FARC': {
+    }, _gen_FArC_formats),
+    'FARC': _lazy_farc_format({
         'remarks': 'farc with encryption and compression support (DT/F/X)',
-        'struct': _FARC_format,
         'compression_support': True,
         'compression_forced': False,
         'fixed_header_size': 20,
@@ -144,10 +161,9 @@ _farc_types = {
         'write_support': True,
         'encryption_write_support': True,
         'format_field': ['FARC', 'FARC_FT'],
-    },
-    'FARC_FT': {    # note: FARC_FT is an internal name only -- reading and writing should use FARC with format 1
+    }, _gen_FARC_formats),
+    'FARC_FT': _lazy_farc_format({    # note: FARC_FT is an internal name only -- reading and writing should use FARC with format 1
         'remarks': 'farc with encryption and compression support (FT)',
-        'struct': _FARC_FT_format,
         'compression_support': True,
         'compression_forced': False,
         'fixed_header_size': 24,
@@ -159,5 +175,5 @@ _farc_types = {
         'write_support': True,
         'encryption_write_support': True,
         'format_field': ['FARC', 'FARC_FT'],
-    },
+    }, _gen_FARC_FT_formats),
 }
\ No newline at end of file
@@ -2,145 +2,172 @@
 FT file helper functions for pyfarc
 """
 
-from io import BytesIO
-from secrets import token_bytes
-from os import getenv
+from os import getenv, cpu_count
 
-try:
+# Cryptodome is slow to import, so it's only imported when first needed
+_cryptodome_checked = None
+
+def _cryptodome_installed():
+    """Returns whether Cryptodome can be imported (importing it on first call)"""
+    
+    global _cryptodome_checked
+    if _cryptodome_checked is None:
+        try:
+            from Cryptodome.Cipher import AES
+            from Cryptodome.Util.Padding import pad, unpad
+            _cryptodome_checked = True
+        except Exception:
+            _cryptodome_checked = False
+    return _cryptodome_checked
+
+def _aes():
+    """Returns Cryptodome's AES module, importing it if needed"""
+    
     from Cryptodome.Cipher import AES
-    from Cryptodome.Util.Padding import pad, unpad
-except Exception:
-    pass # main pyfarc module already handles this
+    return AES
 
-def _needs_FT_decryption(s):
-    """Checks if the FARC file stream needs FT-type decryption"""
+_parallel_decrypt_threshold = 4*1024*1024 # CBC data at least this big is decrypted on multiple threads
+_parallel_decrypt_chunk_size = 1024*1024
+_parallel_decrypt_workers = cpu_count() or 1 # threads don't help on a single CPU, so 1 disables parallel decryption
+
+def _cbc_decrypt(key, iv, data, output=None):
+    """
+    AES-CBC decrypts data (a multiple of 16 bytes). Returns the plaintext (a bytearray for large data, to avoid copying
+    it again), or writes it to output and returns None. output may be the same buffer as data.
+    
+    Large data is split into chunks decrypted concurrently, since each CBC block only needs the previous ciphertext
+    block (used as the chunk's IV). Cryptodome releases the GIL while decrypting.
+    """
+    
+    AES = _aes()
+    if len(data) < _parallel_decrypt_threshold or _parallel_decrypt_workers <= 1:
+        return AES.new(key, AES.MODE_CBC, iv=iv).decrypt(data, output=output)
+    
+    data = memoryview(data).cast('B')
+    out = bytearray(len(data)) if output is None else output
+    out_mv = memoryview(out).cast('B')
     
-    og_pos = s.tell()
+    # get all IVs before decrypting, in case decrypting in place overwrites them
+    starts = range(0, len(data), _parallel_decrypt_chunk_size)
+    ivs = [bytes(iv) if not start else bytes(data[start - 16:start]) for start in starts]
     
-    s.seek(og_pos + 11)
-    encrypted = True if s.read(1)[0] & 4 else False
+    def _decrypt_chunk(start, chunk_iv):
+        end = start + _parallel_decrypt_chunk_size
+        AES.new(key, AES.MODE_CBC, iv=chunk_iv).decrypt(data[start:end], output=out_mv[start:end])
     
-    s.seek(og_pos + 16)
-    alignment = s.read(4)
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(len(ivs), _parallel_decrypt_workers)) as executor:
+        list(executor.map(_decrypt_chunk, starts, ivs))
+    
+    return out if output is None else None
+
+_iv_modes = ['random', 'null', 'derived']
+
+def _FT_iv(iv_mode, key, data, name=None):
+    """
+    Gets an IV for FT encryption of data (a file's data with its name, or the header if name is None).
+    iv_mode None uses 'null' if the PYFARC_NULL_IV environment variable is set, otherwise 'random'.
+    'derived' IVs are a hash of name and data keyed with the encryption key, so unchanged input gives the same output.
+    """
+    
+    if iv_mode is None:
+        iv_mode = 'null' if getenv('PYFARC_NULL_IV') else 'random'
+    
+    if iv_mode == 'null':
+        return b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+    elif iv_mode == 'random':
+        from secrets import token_bytes
+        return token_bytes(16)
+    elif iv_mode == 'derived':
+        from hashlib import blake2b
+        if name is None:
+            h = blake2b(key=key, digest_size=16, person=b'FT header')
+        else:
+            h = blake2b(name.encode('utf-8') + b'\x00', key=key, digest_size=16, person=b'FT file')
+        h.update(data)
+        return h.digest()
+    
+    raise ValueError('Unknown iv_mode {} (expected one of {})'.format(iv_mode, ', '.join(_iv_modes)))
+
+_FT_check_size = 32 # number of bytes at start of farc needed by FT checks
+
+def _needs_FT_decryption_prefix(b):
+    """Checks if FARC data needs FT-type decryption, given at least the first 32 bytes of the file"""
+    
+    encrypted = True if b[11] & 4 else False
+    
+    alignment = b[16:20]
     alignment_bits_popcnt = sum([bin(x).count('1') for x in alignment])
     
-    s.seek(og_pos + 20)
-    format = s.read(4)
+    format = b[20:24]
     
     # heuristic-based detection similar to MML -- this should have a false negative rate of ~1 in 4.8b (compared to MML's ~1 in 134.2m)
     # false positives will require either more than 8 bits set in popcnt (extremely unlikely) or a new subformat which would be unsupported anyway
     # if many bits (>8) are set in alignment, it seems incorrect -- likely encrypted (~1 in 285 false negative)
     # if format doesn't start with null bytes, it seems incorrect -- likely encrypted (~1 in 16.8m false negative)
     # if the entire 16 bytes are null, it indicates a null IV and definite encryption (or a bad file)
-    s.seek(og_pos + 16) # prepare for reading entire IV
-    if encrypted and (alignment_bits_popcnt > 8 or format[:3] != b'\x00\x00\x00' or s.read(16) == b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'):
-        s.seek(og_pos)
+    if encrypted and (alignment_bits_popcnt > 8 or format[:3] != b'\x00\x00\x00' or b[16:32] == b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'):
         return True
     
-    s.seek(og_pos)
     return False
 
-def _is_FT_FARC(s):
-    """Returns whether the FARC file stream is in FT (or FT-based) format"""
+def _is_FT_FARC_prefix(b):
+    """Returns whether FARC data is in FT (or FT-based) format, given at least the first 32 bytes of the file"""
     
-    og_pos = s.tell()
-    magic_str = s.read(4).decode('ascii')
-    s.seek(og_pos)
-    
-    if magic_str != 'FARC':
+    if b[:4] != b'FARC':
         return False
-        
-    if _needs_FT_decryption(s):
-        return True
     
+    if _needs_FT_decryption_prefix(b):
+        return True
     
-    s.seek(og_pos + 20)
-    format = s.read(4)
-    s.seek(og_pos)
-    
-    if format != b'\x00\x00\x00\x00':
+    if b[20:24] != b'\x00\x00\x00\x00':
         return True
     
     return False
 
-def _decrypt_FT_FARC_header(s, key):
+def _decrypt_FT_FARC_header_bytes(header, key):
     """
-    Decrypts header of FT (or FT-based) FARC from stream and returns a new stream containing entire farc
+    Decrypts an FT (or FT-based) FARC header (signature, header_size, then header_size bytes) and returns the
+    decrypted header with header_size updated
     """
     
-    if not _is_FT_FARC(s):
-        return None
-    
-    if not _needs_FT_decryption(s):
-        return None
-    
-    og_pos = s.tell()
+    old_header_size = int.from_bytes(header[4:8], byteorder='big', signed=False)
     
-    out = BytesIO()
+    from Cryptodome.Util.Padding import unpad
     
-    out.write(s.read(4)) # signature
-    
-    old_header_size = int.from_bytes(s.read(4), byteorder='big', signed=False)
-    other_plaintext_header = s.read(8) # other plaintext header stuff
-    
-    cipher = AES.new(key, AES.MODE_CBC, iv=s.read(16))
-    header_data = cipher.decrypt(s.read(old_header_size - 16 - 8)) # 16 is for IV, 8 is for plaintext part of header
+    header_data = _cbc_decrypt(key, header[16:32], header[32:8 + old_header_size]) # header_size doesn't include first 8 bytes, but does include IV
     header_data = unpad(header_data, 16, 'pkcs7')
     new_header_size = len(header_data) + 8
     
-    out.write(new_header_size.to_bytes(4, byteorder='big', signed=False))
-    out.write(other_plaintext_header)
-    out.write(header_data)
-    
-    # resync streams (read old_header_size but wrote new_header_size)
-    out.seek(out.tell() + old_header_size - new_header_size)
-    
-    out.write(s.read())
-    
-    s.seek(og_pos)
-    out.seek(0)
-    return out
+    return header[:4] + new_header_size.to_bytes(4, byteorder='big', signed=False) + header[8:16] + header_data
 
-def _encrypt_FT_FARC_header(instream, outstream, key):
+def _encrypt_FT_FARC_header_bytes(header, key, iv_mode=None):
     """
-    Encrypts header of FT (or FT-based) FARC from instream and writes entire FARC to outstream
-    Ensure input FARC has enough space for IV and AES padding after the header
+    Encrypts an FT (or FT-based) FARC header (signature, header_size, then header_size bytes) and returns the
+    encrypted header with header_size updated
+    The encrypted header is longer, so ensure the FARC has enough space for IV and AES padding after the header
+    (see _FT_iv for iv_mode)
     """
     
-    if not _is_FT_FARC(instream) or _needs_FT_decryption(instream):
-        # file doesn't need encryption???
-        #outstream.write(instream.read())
-        #return
+    if not _is_FT_FARC_prefix(header) or _needs_FT_decryption_prefix(header):
         raise Exception('Wrong format FARC or already encrypted')
     
-    outstream.write(instream.read(4)) # signature
+    from Cryptodome.Util.Padding import pad
     
-    old_header_size = int.from_bytes(instream.read(4), byteorder='big', signed=False)
+    old_header_size = int.from_bytes(header[4:8], byteorder='big', signed=False)
     new_header_size = old_header_size - 8 # temporarily remove stuff that isn't encrypted
     new_header_size += 16 # iv seems to count towards header size
     new_header_size += 16 - (new_header_size % 16) # space for AES padding
     new_header_size += 8 # add size of plaintext parts back
     
-    outstream.write(new_header_size.to_bytes(4, byteorder='big', signed=False))
-    outstream.write(instream.read(8)) # other plaintext header stuff
-    
-    header_data = instream.read(old_header_size - 8) # header_size is 8 bytes longer than encrypted portion
+    header_data = header[16:8 + old_header_size] # header_size is 8 bytes longer than encrypted portion
     header_data = pad(header_data, 16, 'pkcs7')
     
     if new_header_size != len(header_data) + 16 + 8: # 16 is for IV, 8 is for plaintext part of header
         raise Exception('Header size calc is bugged! Please report this! actual: {}, expected: {}'.format(len(header_data) + 16 + 8, new_header_size))
     
-    if getenv('PYFARC_NULL_IV'):
-        iv = b'\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00'
-    else:
-        iv = token_bytes(16)
-    outstream.write(iv)
+    iv = _FT_iv(iv_mode, key, header_data)
+    AES = _aes()
     cipher = AES.new(key, AES.MODE_CBC, iv=iv)
-    outstream.write(cipher.encrypt(header_data))
-    
-    # resync streams (read old_header_size but wrote new_header_size)
-    instream.seek(instream.tell() + new_header_size - old_header_size)
-    
-    outstream.write(instream.read())
     
-    return
\ No newline at end of file
+    return header[:4] + new_header_size.to_bytes(4, byteorder='big', signed=False) + header[8:16] + iv + cipher.encrypt(header_data)
@@ -3,9 +3,11 @@ pyfmh3 reader and writer for Project DIVA FMH3 fontmaps
 can read+write AFT FMH3 and read X FONM
 """
 
-from copy import deepcopy
 from io import BytesIO
+from time import perf_counter
+import struct
 from pydiva.pyfmh3_formats import _fmh3_types
+from pydiva.util.cs3_raw import gen_section_header, gen_relocation_section, gen_eofc_section
 
 
 class UnsupportedFmh3TypeException(Exception):
@@ -67,25 +69,91 @@ def _get_fmh3_length(fonts):
     return fonts[-1]['data']['chars_pointer'] + _char_array_size(fonts[-1]['data']['chars_count'])
 
 
-def to_stream(data, stream, no_copy=False):
+def _pack_fmh3_data(buf, fonts, fmh3_type, data_offset):
+    """
+    Packs FMH3 data from fonts with pointers already set directly into buf at data_offset.
+    Returns a sorted list of relocation offsets (in multiples of address size) for all written pointers.
+    """
+    
+    byte_order = fmh3_type['byte_order']
+    address_size = fmh3_type['address_size']
+    pointer_format = 'Q' if address_size == 8 else 'I'
+    pointer_base = 0 if fmh3_type['absolute_pointers'] else data_offset
+    
+    pointer_positions = []
+    
+    # header (fonts_count is padded to address size)
+    struct.pack_into(byte_order + '4s4xI{}x{}'.format(address_size - 4, pointer_format), buf, data_offset, b'FMH3', len(fonts), _fonts_pointers_min_offset)
+    pointer_positions += [data_offset + 8 + address_size]
+    
+    # font header pointers
+    pos = pointer_base + _fonts_pointers_min_offset
+    struct.pack_into(byte_order + pointer_format * len(fonts), buf, pos, *[font['pointer'] for font in fonts])
+    pointer_positions += range(pos, pos + len(fonts) * address_size, address_size)
+    
+    font_header_struct = struct.Struct(byte_order + 'I7BxIII' + pointer_format)
+    char_format = 'H?xBBBB'
+    
+    for font in fonts:
+        font_data = font['data']
+        chars = font_data['chars']
+        
+        pos = pointer_base + font['pointer']
+        font_header_struct.pack_into(buf, pos,
+            font_data['id'],
+            font_data['advance_width'],
+            font_data['line_height'],
+            font_data['box_width'],
+            font_data['box_height'],
+            font_data['layout_param_1'],
+            font_data['layout_param_2_numerator'],
+            font_data['layout_param_2_denominator'],
+            font_data['other_params?'],
+            font_data['tex_size_chars'],
+            len(chars),
+            font_data['chars_pointer']
+        )
+        pointer_positions += [pos + font_header_struct.size - address_size]
+        
+        struct.pack_into(byte_order + char_format * len(chars), buf, pointer_base + font_data['chars_pointer'], *[
+            v for c in chars for v in (c['codepoint'], c['halfwidth'], c['tex_col'], c['tex_row'], c['glyph_x'], c['glyph_width'])
+        ])
+    
+    return sorted((p - pointer_base) // address_size for p in pointer_positions)
+
+def to_stream(data, stream, no_copy=False, stats=None):
     """
     Converts a dictionary (formatted like the dictionary returned by from_stream) to fontmap data and writes it to a stream.
     
     Set no_copy to True for a speedup and memory usage reduction if you don't mind your input data being contaminated.
+    Set stats to a pydiva.util.stats.Stats object to collect timings for each stage.
+    Raises ValueError if there are no fonts or a font has no chars, since the format can't store those.
     """
     
     magic_str = data['fmh3_type']
     check_fmh3_type(magic_str)
     fmh3_type = _fmh3_types[magic_str]
     
+    # counts are read as "repeat until index >= count - 1", so there's no way to store zero of anything
+    if not data['fonts']:
+        raise ValueError("fontmap must have at least one font")
+    for font in data['fonts']:
+        if not font['chars']:
+            raise ValueError("font {} must have at least one char".format(font['id']))
+    
+    if stats:
+        start = perf_counter()
+        stats.count('entries', len(data['fonts']))
+    
+    # chars are never modified, so copying the font dicts is enough to keep the input clean
     if no_copy:
-        fonts = data['fonts']
-    if not no_copy:
-        fonts = deepcopy(data['fonts'])
+        fonts = [{'data': font} for font in data['fonts']]
+    else:
+        fonts = [{'data': dict(font)} for font in data['fonts']]
     
-    for font in fonts:
-        font['chars_count'] = len(font['chars'])
-    fonts = [{'data': font} for font in fonts]
+    if stats:
+        stats.add('copy', start)
+        start = perf_counter()
     
     global _fonts_pointers_min_offset
     _fonts_pointers_min_offset = fmh3_type['fonts_pointers_min_offset']
@@ -95,32 +163,36 @@ def to_stream(data, stream, no_copy=False):
     _set_char_pointers(fonts, address_size)
     
     if fmh3_type['nest_fmh3_data']:
-        data_size =_get_fmh3_length(fonts)
+        for font in fonts:
+            font['data']['chars_count'] = len(font['data']['chars'])
+        data_size = _get_fmh3_length(fonts)
+        data_pointer = 64
+        big_endian = fmh3_type['byte_order'] == '>'
         
-        return fmh3_type['struct'].build_stream({
-            fmh3_type['nest_fmh3_data']: dict(
-                section_outer=dict(
-                    section=dict(
-                        data_pointer=64,
-                        data_size=data_size,
-                        data=dict(
-                            fonts_count=len(fonts),
-                            fonts_pointers_offset=_fonts_pointers_min_offset,
-                            fonts=fonts
-                        ),
-                        extra_sections=dict() # needed to avoid KeyError during build
-                    )
-                )
-            )
-        }, stream)
+        buf = bytearray(data_pointer + data_size)
+        relocation_offsets = _pack_fmh3_data(buf, fonts, fmh3_type, data_pointer)
+        if stats:
+            stats.add('pack', start, 0, data_size)
+            start = perf_counter()
+        
+        buf += gen_relocation_section(relocation_offsets, address_size)
+        buf += gen_eofc_section()
+        buf[0:data_pointer] = gen_section_header(fmh3_type['nest_fmh3_data'], len(buf) - data_pointer, data_pointer, 0, data_size, big_endian)
+        buf += gen_eofc_section()
+        if stats: stats.add('build', start, data_size, len(buf))
     else:
-        return fmh3_type['struct'].build_stream(dict(
-            fonts_count=len(fonts),
-            fonts_pointers_offset=_fonts_pointers_min_offset,
-            fonts=fonts
-        ), stream)
+        last_font = fonts[-1]['data']
+        buf = bytearray(last_font['chars_pointer'] + len(last_font['chars']) * _char_data_size)
+        _pack_fmh3_data(buf, fonts, fmh3_type, 0)
+        if stats: stats.add('pack', start, 0, len(buf))
+    
+    if stats:
+        stats.peak('buffer_size', len(buf))
+        start = perf_counter()
+    stream.write(buf)
+    if stats: stats.add('write', start, 0, len(buf))
 
-def to_bytes(data, no_copy=False):
+def to_bytes(data, no_copy=False, stats=None):
     """
     Converts a dictionary (formatted like the dictionary returned by from_bytes) to an in-memory bytes object containing fontmap data.
     
@@ -128,7 +200,7 @@ def to_bytes(data, no_copy=False):
     """
     
     with BytesIO() as s:
-        to_stream(data, s, no_copy)
+        to_stream(data, s, no_copy, stats)
         return s.getvalue()
 
 
@@ -155,9 +227,14 @@ def _parsed_to_dict(fmhdata, nested_fmh_section):
     
     return {'fmh3_type': magic_str, 'fonts': fonts}
 
-def from_stream(s):
-    """Converts fontmap data from a stream to a dictionary."""
+def from_stream(s, validate_relocation=False, stats=None):
+    """
+    Converts fontmap data from a stream to a dictionary.
+    Setting validate_relocation will check the relocation table of FONM types against all parsed pointers.
+    Set stats to a pydiva.util.stats.Stats object to collect timings for each stage.
+    """
     
+    if stats: start = perf_counter()
     pos = s.tell()
     magic_str = s.read(4).decode('ascii')
     s.seek(pos)
@@ -180,16 +257,32 @@ def from_stream(s):
                 break
     s.seek(pos)
     
-    fmhdata = fmh3_type['struct'].parse_stream(s)
+    if stats:
+        stats.add('sniff', start)
+        start = perf_counter()
+    
+    fmhdata = fmh3_type['struct'].parse_stream(s, validate_relocation=validate_relocation)
+    
+    if stats:
+        stats.add('parse', start, s.tell() - pos)
+        start = perf_counter()
+    
     res = _parsed_to_dict(fmhdata, fmh3_type['nest_fmh3_data'])
     res['fmh3_type'] = magic_str # force type to what we already determined
+    
+    if stats:
+        stats.add('convert', start)
+        stats.count('entries', len(res['fonts']))
     return res
 
-def from_bytes(b):
-    """Converts fontmap data from bytes to a dictionary."""
+def from_bytes(b, validate_relocation=False, stats=None):
+    """
+    Converts fontmap data from bytes to a dictionary.
+    Setting validate_relocation will check the relocation table of FONM types against all parsed pointers.
+    """
     
     with BytesIO(b) as s:
-        return from_stream(s)
+        return from_stream(s, validate_relocation, stats)
 
 
 # test_fmh = {'fmh3_type': 'FMH3', 'fonts': [{"id":2, "advance_width":24, "line_height":30, "box_width":26, "box_height":32, "layout_param_1":3, "layout_param_2_numerator":1, "layout_param_2_denominator":1, "other_params?":0, "tex_size_chars":19, "chars":[{"codepoint":48, "halfwidth":False, "tex_col":0, "tex_row":0, "glyph_x":0, "glyph_width":24}, {"codepoint":49, "halfwidth":False, "tex_col":1, "tex_row":0, "glyph_x":0, "glyph_width":24}]}]}
\ No newline at end of file
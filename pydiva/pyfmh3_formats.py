@@ -2,24 +2,11 @@
 FMH3 format information for pyfmh3
 """
 
-_construct_version = None
-try:
-    from construct import __version__ as _construct_version
-    _construct_version = [int(v) for v in _construct_version.split('.')]
-except Exception:
-    # I'd rather just continue than throw an error if this fails for some reason, like versioning changes,
-    # so just let _construct_version be None
-    # Users following instructions should never have a low version anyway
-    pass
-
-if _construct_version:
-    if (_construct_version[0] < 2) or ((_construct_version[0] == 2) and (_construct_version[1] < 9)):
-        raise Exception('Construct version too low, please install version 2.9+')
-
-from construct import Struct, Computed, Tell, Const, Padding, Padded, Pointer, RepeatUntil, Byte, Int16ul, Int16ub, Flag, Rebuild, If, Int32ub, Seek, Int32ul, Int64ul
-from pydiva.util.cs3_file_utils import RelocationPointerAdapter, gen_relocation_struct, relocation_data_len, gen_eofc_struct, gen_cs3_file
+from pydiva.util.lazy_formats import import_construct, LazyFormat
 
 def _gen_fmh3_struct(int_type, pointer_type, codepoint_type, addr_mode='rel'):
+    from construct import Struct, Computed, Tell, Const, Padding, Padded, Pointer, RepeatUntil, Byte, Flag
+    
     return Struct(
         "pointer_offset" / (Computed(0) if addr_mode == 'abs' else Tell),
         "signature" / Const(b'FMH3'),
@@ -55,39 +42,67 @@ def _gen_fmh3_struct(int_type, pointer_type, codepoint_type, addr_mode='rel'):
         ))),
     )
 
+# structs are generated on first use of each type, so importing doesn't need construct
+
+def _gen_FMH3_struct():
+    from construct import Int32ul, Int16ul
+    
+    return {'struct': _gen_fmh3_struct(Int32ul, Int32ul, Int16ul)}
+
+def _gen_FONM_struct():
+    from construct import Int32ul, Int64ul, Int16ul
+    from pydiva.util.cs3_file_utils import RelocationPointerAdapter, gen_cs3_file
+    
+    return {'struct': gen_cs3_file(Int32ul, Int64ul, [{
+        'signature': 'FONM',
+        'data_size': lambda this: this.data_size,
+        'data_subcon': _gen_fmh3_struct(Int32ul, RelocationPointerAdapter(Int64ul), Int16ul),
+        'enrs': True,
+        'relocation': True
+    }])}
+
+def _gen_FONM_F2_struct():
+    from construct import Int32ub, Int16ub
+    from pydiva.util.cs3_file_utils import RelocationPointerAdapter, gen_cs3_file
+    
+    return {'struct': gen_cs3_file(Int32ub, Int32ub, [{
+        'signature': 'FONM',
+        'data_size': lambda this: this.data_size,
+        'data_subcon': _gen_fmh3_struct(Int32ub, RelocationPointerAdapter(Int32ub), Int16ub, addr_mode='abs'),
+        'enrs': False,
+        'relocation': True
+    }])}
+
+def _lazy_fmh3_format(info, builder):
+    def _build():
+        import_construct()
+        return builder()
+    return LazyFormat(info, _build, ('struct',))
+
 _fmh3_types = {
-    'FMH3': {
+    'FMH3': _lazy_fmh3_format({
         'remarks': 'unencapsulated FT fontmap',
-        'struct': _gen_fmh3_struct(Int32ul, Int32ul, Int16ul),
         'address_size': 4,
+        'byte_order': '<',
+        'absolute_pointers': False,
         'fonts_pointers_min_offset': 32,
         'nest_fmh3_data': False,
-    },
-    'FONM': {
+    }, _gen_FMH3_struct),
+    'FONM': _lazy_fmh3_format({
         'remarks': 'X fontmap in FONM container',
-        'struct': gen_cs3_file(Int32ul, Int64ul, [{
-            'signature': 'FONM',
-            'data_size': lambda this: this.data_size,
-            'data_subcon': _gen_fmh3_struct(Int32ul, RelocationPointerAdapter(Int64ul), Int16ul),
-            'enrs': True,
-            'relocation': True
-        }]),
         'address_size': 8,
+        'byte_order': '<',
+        'absolute_pointers': False,
         'fonts_pointers_min_offset': 32,
         'nest_fmh3_data': 'FONM',
         'alternate_type_checks': [{'type': 'FONM_F2', 'checks': [{'offset': 15, 'mask': 0x08}]}]
-    },
-    'FONM_F2': {
+    }, _gen_FONM_struct),
+    'FONM_F2': _lazy_fmh3_format({
         'remarks': 'F2nd fontmap in FONM container',
-        'struct': gen_cs3_file(Int32ub, Int32ub, [{
-            'signature': 'FONM',
-            'data_size': lambda this: this.data_size,
-            'data_subcon': _gen_fmh3_struct(Int32ub, RelocationPointerAdapter(Int32ub), Int16ub, addr_mode='abs'),
-            'enrs': False,
-            'relocation': True
-        }]),
         'address_size': 4,
+        'byte_order': '>',
+        'absolute_pointers': True,
         'fonts_pointers_min_offset': 32 + 64, # because FONM headers are within the same address space :/
         'nest_fmh3_data': 'FONM',
-    },
-}
\ No newline at end of file
+    }, _gen_FONM_F2_struct),
+}
@@ -4,62 +4,65 @@ Stuff for dealing with sectioned from CS3 engine games. (F2nd, X)
 Only single-section binary files (eg. FONM, DSC) + relocation are tested, so
 other stuff is probably wrong, but the intent is that is can be expanded in the
 future.
+
+Struct generation (gen_*_struct, gen_cs3_sections, gen_cs3_file) is memoized,
+so generating the same format again returns the existing struct. Lambdas and
+subcons are compared by identity, so reuse the same callables (eg. define the
+format once) to get cache hits -- inline lambdas never hit.
+
+Relocation table encoding and raw section headers are in cs3_raw (which doesn't
+need Construct) and are re-exported here.
 """
 
+from array import array
+from collections import OrderedDict
+from functools import wraps
 from construct import Adapter, Struct, Tell, Const, Rebuild, Int32ub, Int32ul, Padding, Bytes, Default, If, Seek, Probe
+from pydiva.util.cs3_raw import gen_relocation_data, relocation_data_len, parse_relocation_data, RelocationTableBuilder, gen_section_header, gen_relocation_section, gen_eofc_section
 
-def gen_relocation_data(offsets):
-    """
-    Given a list of offsets (offsets are in multiples of pointer length),
-    output bytes to put in the relocation section's data.
-    """
-    
-    last_offset = 0
-    out = b''
-    for o in offsets:
-        distance = o - last_offset
-        
-        if distance > 0x3ff:
-            b = distance.to_bytes(4, byteorder='big')
-            b = bytes([b[0] | 0xc0]) + b[1:]
-        elif distance > 0x3f:
-            b = distance.to_bytes(2, byteorder='big')
-            b = bytes([b[0] | 0x80]) + b[1:]
-        else:
-            b = distance.to_bytes(1, byteorder='big')
-            b = bytes([b[0] | 0x40]) + b[1:]
-        
-        out += b
-        last_offset = o
-    
-    out_size = len(out) + 4
-    out = out_size.to_bytes(4, byteorder='little', signed=False) + out # prepend length
-    
-    # pad to 16 bytes
-    while len(out) % 16:
-        out += b'\x00'
+
+class RelocationMismatchException(Exception):
+    pass
+
+def _find_pointer_offset_ctx(context):
+    """Finds the closest context with pointer_offset by recursing up."""
     
-    return out
+    pointer_offset_ctx = context
+    while hasattr(pointer_offset_ctx, '_') and not hasattr(pointer_offset_ctx, 'pointer_offset'):
+        pointer_offset_ctx = pointer_offset_ctx._
+    return pointer_offset_ctx
 
-def relocation_data_len(offsets):
-    """
-    Get the length of relocation data.
-    (implemnted by calling len on gen_relocation_data result)
-    """
+def _validate_relocation_enabled(context):
+    """Checks if validate_relocation=True was passed to parse/parse_stream by looking at the root context."""
     
-    return len(gen_relocation_data(offsets))
+    while hasattr(context, '_'):
+        context = context._
+    return context.get('validate_relocation', False)
 
 class RelocationPointerAdapter(Adapter):
     """
     Wraps the pointer type, and generates relocation data during building.
     
-    Relocation data will be put in root context's extra_sections['pof1']['data']
+    Relocation data will be put in root context's extra_sections['POF']['data']
+    as a RelocationTableBuilder
     (root context is up one level from level that contains pointer_offset)
     """
     
     def _decode(self, obj, context, path):
         # called at parsing time to return a modified version of obj
         
+        # when validating, record pointer offsets in the same place as relocation
+        # data parsing will look (parent context of pointer_offset)
+        if _validate_relocation_enabled(context):
+            pointer_offset_ctx = _find_pointer_offset_ctx(context)
+            pointer_offset = getattr(pointer_offset_ctx, 'pointer_offset', 0)
+            pointer_size = self.subcon.sizeof()
+            offset = context._io.tell() - pointer_size - pointer_offset
+            
+            if not '_relocation_pointers' in pointer_offset_ctx._:
+                pointer_offset_ctx._['_relocation_pointers'] = array('I')
+            pointer_offset_ctx._['_relocation_pointers'].append(offset)
+        
         return obj
 
     def _encode(self, obj, context, path):
@@ -68,9 +71,7 @@ class RelocationPointerAdapter(Adapter):
         io_offset = context._io.tell()
         
         # try to find the current context's pointer offset by recursing up
-        pointer_offset_ctx = context
-        while hasattr(pointer_offset_ctx, '_') and not hasattr(pointer_offset_ctx, 'pointer_offset'):
-            pointer_offset_ctx = pointer_offset_ctx._
+        pointer_offset_ctx = _find_pointer_offset_ctx(context)
         pointer_offset = getattr(pointer_offset_ctx, 'pointer_offset', 0)
         
         offset = io_offset - pointer_offset
@@ -86,28 +87,116 @@ class RelocationPointerAdapter(Adapter):
             pointer_offset_ctx._['extra_sections'] = {}
         if not 'POF' in pointer_offset_ctx._['extra_sections']:
             pointer_offset_ctx._['extra_sections']['POF'] = {}
-        if not 'data' in pointer_offset_ctx._['extra_sections']['POF']:
-            pointer_offset_ctx._['extra_sections']['POF']['data'] = []
-        
-        pointer_offset_ctx._['extra_sections']['POF']['data'] += [offset]
+        pof = pointer_offset_ctx._['extra_sections']['POF']
+        if not isinstance(pof.get('data'), RelocationTableBuilder):
+            pof['data'] = RelocationTableBuilder(pof.get('data', []))
         
-        pointer_offset_ctx._['extra_sections']['POF']['data'].sort()
+        pof['data'].add(offset)
         
         return obj
 
+def _relocation_offsets(obj, pointer_size):
+    """Converts parsed relocation data (array of byte offsets) back to offsets in multiples of pointer length."""
+    
+    if isinstance(obj, array):
+        return [o // pointer_size for o in obj]
+    return obj
+
 class RelocationDataAdapter(Adapter):
-    """Converts a list of pointer offsets into relocation section data."""
+    """
+    Converts a list of pointer offsets into relocation section data.
+    
+    Parsing returns an array('I') of byte offsets (see parse_relocation_data),
+    which will be converted back when building.
+    If validate_relocation=True is passed to parse, pointers recorded by
+    RelocationPointerAdapter are checked against the table, and
+    RelocationMismatchException is raised if they don't match.
+    """
+    
+    def __init__(self, subcon, pointer_size):
+        super().__init__(subcon)
+        self.pointer_size = pointer_size
     
     def _decode(self, obj, context, path):
         # called at parsing time to return a modified version of obj
         
-        return obj
+        offsets = parse_relocation_data(obj, self.pointer_size)
+        
+        if _validate_relocation_enabled(context):
+            # context is POF struct, then extra_sections, then the section that contains pointers
+            section_ctx = context._._
+            pointers = sorted(section_ctx.get('_relocation_pointers', []))
+            if pointers != offsets.tolist():
+                missing = sorted(set(pointers) - set(offsets))
+                extra = sorted(set(offsets) - set(pointers))
+                raise RelocationMismatchException('Relocation table doesn\'t match pointers (missing: {}, unexpected: {})'.format(missing[:8], extra[:8]))
+        
+        return offsets
 
     def _encode(self, obj, context, path):
         # called at building time to return a modified version of obj
         
-        return gen_relocation_data(obj)
+        if isinstance(obj, RelocationTableBuilder):
+            return obj.data()
+        return gen_relocation_data(_relocation_offsets(obj, self.pointer_size))
+
+_struct_cache = OrderedDict() # key -> struct, least recently used first
+_struct_cache_max_size = 128 # one gen_cs3_file call caches a struct per section/subsection too
+
+def _freeze(obj):
+    """Converts obj to a hashable cache key. (dicts and lists are converted recursively, anything else is used as-is)"""
+    
+    if isinstance(obj, dict):
+        return (dict, tuple(sorted((k, _freeze(v)) for k, v in obj.items())))
+    if isinstance(obj, (list, tuple)):
+        return (list, tuple(_freeze(v) for v in obj))
+    return obj
+
+def _cached_struct(func):
+    """
+    Memoizes a struct generation function on its arguments, keeping up to
+    _struct_cache_max_size structs and evicting the least recently used.
+    Lambdas and subcons in arguments are compared by identity, so keep them
+    around (eg. in a format definition) to get cache hits.
+    """
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            key = (func.__name__, _freeze(args), _freeze(kwargs))
+            struct = _struct_cache[key]
+        except TypeError: # unhashable argument, can't cache
+            return func(*args, **kwargs)
+        except KeyError:
+            struct = func(*args, **kwargs)
+            _struct_cache[key] = struct
+            while len(_struct_cache) > _struct_cache_max_size:
+                _struct_cache.popitem(last=False)
+            return struct
+        
+        _struct_cache.move_to_end(key)
+        return struct
+    
+    return wrapper
+
+def clear_struct_cache():
+    """Clears all cached structs from gen_* functions."""
+    
+    _struct_cache.clear()
+
+def precompile_cs3_file(int_type, pointer_type, sections):
+    """
+    Generates and caches a struct for a CS3 file format ahead of time (eg. at import).
+    Later calls to gen_cs3_file with the same arguments (including the same
+    lambda and subcon objects) will return it without any construction cost,
+    unless it has since been evicted as least recently used.
+    """
+    
+    return gen_cs3_file(int_type, pointer_type, sections)
+
+_default_data_subcon = Bytes(lambda this: this.data_size)
 
+@_cached_struct
 def gen_relocation_struct(pointer_type, depth):
     """
     Generates a Construct struct for a POFx (relocation) section.
@@ -123,16 +212,17 @@ def gen_relocation_struct(pointer_type, depth):
     return Struct(
         "pointer_offset" / Tell,
         "signature" / Const(b'POF0' if pointer_type.sizeof() == 4 else b'POF1'),
-        "section_size" / Rebuild(Int32ul, lambda this: relocation_data_len(this.data)),
+        "section_size" / Rebuild(Int32ul, lambda this: relocation_data_len(_relocation_offsets(this.data, pointer_type.sizeof()))),
         "data_pointer" / Default(Int32ul, 32),
         "flags" / Const(0x00000018 if int_type == Int32ub else 0x10000000, int_type),
         "depth" / Rebuild(Int32ul, depth),
         "data_size" / Rebuild(Int32ul, lambda this: this.section_size),
         Padding(lambda this: this.data_pointer - 24),
         Seek(lambda this: this.data_pointer + this.pointer_offset),
-        "data" / RelocationDataAdapter(Bytes(lambda this: this.data_size))
+        "data" / RelocationDataAdapter(Bytes(lambda this: this.data_size), pointer_type.sizeof())
     )
 
+@_cached_struct
 def gen_eofc_struct(depth, fix_parent_size=None):
     """Generates a Construct struct for an EOFC (end of file) section."""
     
@@ -157,7 +247,8 @@ def gen_eofc_struct(depth, fix_parent_size=None):
         ))
     )
 
-def gen_section_struct(int_type, pointer_type, signature, depth, data_size=0, data_subcon=Bytes(lambda this: this.data_size), enrs=False, relocation=False, optional=False):
+@_cached_struct
+def gen_section_struct(int_type, pointer_type, signature, depth, data_size=0, data_subcon=_default_data_subcon, enrs=False, relocation=False, optional=False):
     """
     Generates a Construct scruct for an arbitrary section, with user-defined
     signature, data_size (can be lambda), and data subcon.
@@ -212,6 +303,7 @@ def gen_section_struct(int_type, pointer_type, signature, depth, data_size=0, da
         ))
     ))
 
+@_cached_struct
 def gen_cs3_sections(int_type, pointer_type, sections, depth=0):
     """
     Generates a Construct scruct for multiple sections, including children,
@@ -272,7 +364,7 @@ def gen_cs3_sections(int_type, pointer_type, sections, depth=0):
     
     struct = Struct()
     for s in sections:
-        ss = gen_section_struct(int_type, pointer_type, s['signature'], depth, s.get('data_size', 0), s.get('data_subcon', Bytes(lambda this: this.data_size)), s.get('enrs'), s.get('relocation'), s.get('optional'))
+        ss = gen_section_struct(int_type, pointer_type, s['signature'], depth, s.get('data_size', 0), s.get('data_subcon', _default_data_subcon), s.get('enrs'), s.get('relocation'), s.get('optional'))
         
         cs = gen_cs3_sections(int_type, pointer_type, s.get('child_sections', []), depth + 1)
         ss += cs
@@ -282,6 +374,7 @@ def gen_cs3_sections(int_type, pointer_type, sections, depth=0):
     
     return struct
 
+@_cached_struct
 def gen_cs3_file(int_type, pointer_type, sections):
     """
     Generates a Construct scruct for a file with multiple sections, including
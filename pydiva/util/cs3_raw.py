@@ -0,0 +1,169 @@
+"""
+Raw bytes helpers for sectioned files from CS3 engine games. (F2nd, X)
+
+Encodes and decodes relocation tables and generates section headers without
+Construct, so writers that don't need structs (eg. pyfmh3.to_stream) don't have
+to import it. cs3_file_utils re-exports everything here.
+"""
+
+from array import array
+
+def _relocation_entry_size(distance):
+    """Returns the encoded size of a single relocation entry for the given distance."""
+    
+    if distance > 0x3ff:
+        return 4
+    elif distance > 0x3f:
+        return 2
+    else:
+        return 1
+
+def gen_relocation_data(offsets):
+    """
+    Given a list of offsets (offsets are in multiples of pointer length),
+    output bytes to put in the relocation section's data.
+    """
+    
+    last_offset = 0
+    out = bytearray(4) # space for length
+    for o in offsets:
+        distance = o - last_offset
+        
+        if distance > 0x3ff:
+            out += (distance | 0xc0000000).to_bytes(4, byteorder='big')
+        elif distance > 0x3f:
+            out += (distance | 0x8000).to_bytes(2, byteorder='big')
+        else:
+            out += (distance | 0x40).to_bytes(1, byteorder='big')
+        
+        last_offset = o
+    
+    out[0:4] = len(out).to_bytes(4, byteorder='little', signed=False) # prepend length
+    
+    # pad to 16 bytes
+    if len(out) % 16:
+        out += bytes(16 - (len(out) % 16))
+    
+    return bytes(out)
+
+def relocation_data_len(offsets):
+    """
+    Get the length of relocation data.
+    (uses the cached data for RelocationTableBuilder, otherwise sums entry sizes without encoding)
+    """
+    
+    if isinstance(offsets, RelocationTableBuilder):
+        return len(offsets.data())
+    
+    size = 4
+    last_offset = 0
+    for o in offsets:
+        size += _relocation_entry_size(o - last_offset)
+        last_offset = o
+    
+    if size % 16: size += 16 - (size % 16)
+    return size
+
+def parse_relocation_data(data, pointer_size=1):
+    """
+    Decodes relocation section data (as output by gen_relocation_data) to an
+    array('I') of pointer offsets.
+    
+    Offsets are multiplied by pointer_size, so with the correct pointer_size
+    they're byte offsets in the section's address space (relative to section
+    data for X, or the start of the file for F2nd).
+    """
+    
+    data = memoryview(data)
+    end = min(int.from_bytes(data[0:4], byteorder='little', signed=False), len(data))
+    
+    out = array('I')
+    append = out.append
+    last_offset = 0
+    i = 4
+    while i < end:
+        b = data[i]
+        prefix = b & 0xc0
+        
+        if prefix == 0x40:
+            last_offset += b & 0x3f
+            i += 1
+        elif prefix == 0x80:
+            last_offset += ((b & 0x3f) << 8) | data[i + 1]
+            i += 2
+        elif prefix == 0xc0:
+            last_offset += int.from_bytes(data[i:i + 4], byteorder='big') & 0x3fffffff
+            i += 4
+        else:
+            break # reached padding
+        
+        append(last_offset * pointer_size)
+    
+    return out
+
+class RelocationTableBuilder:
+    """
+    Collects pointer offsets (in multiples of pointer length) in any order, then
+    sorts and encodes them once.
+    The encoded relocation data is cached until another offset is added.
+    """
+    
+    def __init__(self, offsets=()):
+        self._offsets = list(offsets)
+        self._data = None
+    
+    def add(self, offset):
+        """Adds a pointer offset."""
+        
+        self._offsets.append(offset)
+        self._data = None
+    
+    def offsets(self):
+        """Returns the sorted list of pointer offsets."""
+        
+        if self._data is None:
+            self._offsets.sort()
+        return self._offsets
+    
+    def data(self):
+        """Returns the encoded relocation data (see gen_relocation_data)."""
+        
+        if self._data is None:
+            self._data = gen_relocation_data(self.offsets())
+        return self._data
+    
+    def __len__(self):
+        return len(self._offsets)
+    
+    def __iter__(self):
+        return iter(self.offsets())
+
+def gen_section_header(signature, section_size, data_pointer=32, depth=0, data_size=0, big_endian=False):
+    """
+    Generates raw bytes for a section header (padded to data_pointer) without
+    using Construct.
+    Matches the header written by gen_section_struct/gen_relocation_struct/gen_eofc_struct.
+    """
+    
+    out = bytearray(data_pointer)
+    out[0:4] = signature.encode('ascii')
+    out[4:8] = section_size.to_bytes(4, byteorder='little', signed=False)
+    out[8:12] = data_pointer.to_bytes(4, byteorder='little', signed=False)
+    out[12:16] = b'\x00\x00\x00\x18' if big_endian else b'\x00\x00\x00\x10'
+    out[16:20] = depth.to_bytes(4, byteorder='little', signed=False)
+    out[20:24] = data_size.to_bytes(4, byteorder='little', signed=False)
+    return bytes(out)
+
+def gen_relocation_section(offsets, pointer_size, depth=0):
+    """
+    Generates raw bytes for a complete POFx (relocation) section without using Construct.
+    offsets must already be sorted and in multiples of pointer_size.
+    """
+    
+    data = gen_relocation_data(offsets)
+    return gen_section_header('POF0' if pointer_size == 4 else 'POF1', len(data), 32, depth, len(data)) + data
+
+def gen_eofc_section(depth=0):
+    """Generates raw bytes for an EOFC (end of file) section without using Construct."""
+    
+    return gen_section_header('EOFC', 0, 32, depth, 0)
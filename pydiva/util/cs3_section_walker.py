@@ -0,0 +1,125 @@
+"""
+Lightweight walker for sectioned files from CS3 engine games. (F2nd, X)
+
+Reads section headers only, without Construct or a schema for section data.
+Works on anything supporting the buffer protocol (bytes, bytearray, mmap...)
+and returns memoryview slices for section data, so nothing is copied.
+
+Example:
+```
+with open('fontmap.fnm', 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+    for s in iter_section_headers(m):
+        print (s['signature'], s['depth'], s['data_offset'], s['data_size'])
+```
+(release memoryviews from the results before closing an mmap)
+"""
+
+_header_size = 24
+_subsection_types = {'ENRS': 'enrs', 'POF0': 'relocation', 'POF1': 'relocation'}
+
+def _is_signature(b):
+    """Checks if 4 bytes look like a section signature."""
+    
+    return len(b) == 4 and b[0] != 0x20 and all(0x20 <= c <= 0x7e for c in b)
+
+def _read_header(mv, pos):
+    """Reads a section header at pos, returns a section dict."""
+    
+    data_pointer = int.from_bytes(mv[pos + 8:pos + 12], byteorder='little', signed=False)
+    data_size = int.from_bytes(mv[pos + 20:pos + 24], byteorder='little', signed=False)
+    data_offset = pos + data_pointer
+    
+    return {
+        'signature': bytes(mv[pos:pos + 4]).decode('ascii'),
+        'depth': int.from_bytes(mv[pos + 16:pos + 20], byteorder='little', signed=False),
+        'offset': pos,
+        'section_size': int.from_bytes(mv[pos + 4:pos + 8], byteorder='little', signed=False),
+        'big_endian': bool(mv[pos + 15] & 0x08),
+        'data_offset': data_offset,
+        'data_size': data_size,
+        'data': mv[data_offset:data_offset + data_size],
+    }
+
+def iter_section_headers(buf, offset=0):
+    """
+    Yields a section dict for every section header in buf, in file order, including ENRS/POF/EOFC sections.
+    Stops at the end of buf or if data at the next header position doesn't look like a section.
+    
+    Section dicts contain signature, depth, offset (of header), section_size, big_endian, data_offset, data_size,
+    and data (memoryview of data_size bytes at data_offset).
+    """
+    
+    mv = memoryview(buf).cast('B')
+    pos = offset
+    
+    while pos + _header_size <= len(mv):
+        if not _is_signature(mv[pos:pos + 4]):
+            # sections should be aligned, so try that before giving up
+            aligned_pos = pos + 16 - (pos % 16) if pos % 16 else pos
+            if aligned_pos == pos or aligned_pos + _header_size > len(mv) or not _is_signature(mv[aligned_pos:aligned_pos + 4]):
+                return
+            pos = aligned_pos
+        
+        section = _read_header(mv, pos)
+        if section['data_offset'] < pos + _header_size: # bad data_pointer, would never advance
+            return
+        yield section
+        pos = section['data_offset'] + section['data_size']
+
+def get_section_tree(buf, offset=0):
+    """
+    Returns a tree of sections from buf as a list of top level section dicts.
+    
+    Each section dict is like those from iter_section_headers, with added keys:
+    enrs, relocation, eofc (the matching sub-section dicts or None), and children (list of child section dicts).
+    
+    EOFC sections that don't close a section (ie. end of file) are ignored.
+    """
+    
+    roots = []
+    stack = []
+    
+    for section in iter_section_headers(buf, offset):
+        signature = section['signature']
+        
+        if signature == 'EOFC':
+            # close the most recent open section at this depth (and anything inside it)
+            for i in range(len(stack) - 1, -1, -1):
+                if stack[i]['depth'] == section['depth']:
+                    stack[i]['eofc'] = section
+                    del stack[i:]
+                    break
+            continue
+        
+        if signature in _subsection_types and stack:
+            stack[-1][_subsection_types[signature]] = section
+            continue
+        
+        section.update(enrs=None, relocation=None, eofc=None, children=[])
+        
+        while stack and stack[-1]['depth'] >= section['depth']:
+            stack.pop()
+        
+        if stack:
+            stack[-1]['children'] += [section]
+        else:
+            roots += [section]
+        
+        stack += [section]
+    
+    return roots
+
+def find_section(sections, path):
+    """
+    Finds a section in a tree from get_section_tree by a list of signatures (eg. ['DSC ', 'CHLD']).
+    Returns the first matching section dict, or None if not found.
+    """
+    
+    section = None
+    for signature in path:
+        section = next((s for s in sections if s['signature'] == signature), None)
+        if not section:
+            return None
+        sections = section['children']
+    
+    return section
@@ -0,0 +1,43 @@
+"""
+Helpers for generating Construct structs on first use, so importing pydiva modules doesn't need to import construct.
+"""
+
+def import_construct():
+    """Imports construct, checking its version. Returns the construct module."""
+    
+    import construct
+    
+    _construct_version = None
+    try:
+        _construct_version = [int(v) for v in construct.__version__.split('.')]
+    except Exception:
+        # I'd rather just continue than throw an error if this fails for some reason, like versioning changes,
+        # so just let _construct_version be None
+        # Users following instructions should never have a low version anyway
+        pass
+    
+    if _construct_version:
+        if (_construct_version[0] < 2) or ((_construct_version[0] == 2) and (_construct_version[1] < 9)):
+            raise Exception('Construct version too low, please install version 2.9+')
+    
+    return construct
+
+
+class LazyFormat(dict):
+    """
+    Format info dictionary where some keys are generated on first access.
+    builder is called with no arguments and should return a dictionary of the generated keys.
+    (use `format[key]` for generated keys -- get and `in` don't trigger generation)
+    """
+    
+    def __init__(self, info, builder, lazy_keys):
+        super().__init__(info)
+        self._builder = builder
+        self._lazy_keys = lazy_keys
+    
+    def __missing__(self, key):
+        if not key in self._lazy_keys:
+            raise KeyError(key)
+        
+        self.update(self._builder())
+        return self[key]
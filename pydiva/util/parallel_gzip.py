@@ -0,0 +1,104 @@
+"""
+pigz-style parallel gzip compression for large data.
+
+Data is split into fixed-size blocks that are deflated on multiple threads (zlib releases the GIL). Each block uses the
+end of the previous block as a preset dictionary and ends with a sync flush, so the blocks join into one normal
+deflate stream. The result is a single gzip member with a combined CRC32 and ISIZE, readable by anything that reads
+gzip (including zlib.decompress with wbits=16+zlib.MAX_WBITS).
+"""
+
+import gzip
+import zlib
+from os import cpu_count
+
+_window_size = 32768 # deflate dictionary size
+
+def _gf2_matrix_times(mat, vec):
+    s = 0
+    i = 0
+    while vec:
+        if vec & 1:
+            s ^= mat[i]
+        vec >>= 1
+        i += 1
+    return s
+
+def _gf2_matrix_multiply(a, b):
+    return [_gf2_matrix_times(a, b[n]) for n in range(32)]
+
+def _gf2_matrix_square(mat):
+    return _gf2_matrix_multiply(mat, mat)
+
+def _crc32_zeros_operator(length):
+    """
+    Returns the GF(2) matrix that updates a CRC32 as if length zero bytes were appended to its data.
+    Building it is the slow part of combining CRCs, so it can be reused for pieces of the same length.
+    """
+    
+    mat = [0xedb88320] + [1 << n for n in range(31)] # operator for one zero bit
+    for i in range(3):
+        mat = _gf2_matrix_square(mat) # one zero byte after three squares
+    
+    op = None
+    while length:
+        if length & 1:
+            op = mat if op is None else _gf2_matrix_multiply(mat, op)
+        length >>= 1
+        if length:
+            mat = _gf2_matrix_square(mat)
+    return op
+
+def crc32_combine(crc1, crc2, len2, operator=None):
+    """
+    Combines CRC32s of two pieces of data into the CRC32 of both, given the length of the second piece.
+    (same as zlib's crc32_combine, which Python's zlib module doesn't expose)
+    operator can be set to _crc32_zeros_operator(len2) to skip building it when combining many pieces of one length.
+    """
+    
+    if len2 <= 0:
+        return crc1
+    
+    return _gf2_matrix_times(operator or _crc32_zeros_operator(len2), crc1) ^ crc2
+
+def _compress_block(data, start, end, level, last):
+    """Deflates data[start:end] (using the preceding window as dictionary). Returns (deflate data, crc32)."""
+    
+    mv = memoryview(data)
+    if start:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=mv[max(0, start - _window_size):start])
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    
+    block = mv[start:end]
+    out = compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return out, zlib.crc32(block)
+
+def compress(data, compresslevel=9, mtime=None, block_size=1024*1024, workers=None, executor=None):
+    """
+    Compresses data to a single gzip member using multiple threads.
+    mtime is written to the gzip header like gzip.compress.
+    Uses executor if set, otherwise creates a thread pool with workers threads (default is the number of CPUs).
+    """
+    
+    header = gzip.compress(b'', compresslevel=compresslevel, mtime=mtime)[:10]
+    
+    bounds = [(start, min(start + block_size, len(data))) for start in range(0, len(data), block_size)] or [(0, 0)]
+    
+    def _run(executor):
+        return list(executor.map(lambda b: _compress_block(data, b[0], b[1], compresslevel, b[1] == len(data)), bounds))
+    
+    if executor:
+        blocks = _run(executor)
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=workers or cpu_count() or 1) as executor:
+            blocks = _run(executor)
+    
+    # all blocks but the last are block_size long, so they can share one operator
+    block_operator = _crc32_zeros_operator(block_size)
+    crc = blocks[0][1]
+    for (start, end), (deflated, block_crc) in zip(bounds[1:], blocks[1:]):
+        crc = crc32_combine(crc, block_crc, end - start, block_operator if end - start == block_size else None)
+    
+    trailer = crc.to_bytes(4, byteorder='little') + (len(data) & 0xffffffff).to_bytes(4, byteorder='little')
+    return b''.join([header] + [deflated for deflated, block_crc in blocks] + [trailer])
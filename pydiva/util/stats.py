@@ -0,0 +1,76 @@
+"""
+Opt-in instrumentation for pyfarc and pyfmh3.
+
+Pass a Stats object as stats to reading/writing functions to collect wall time and bytes for each processing stage,
+plus counters and peak sizes. When stats is None (the default), functions skip all timing.
+
+Example:
+```
+stats = Stats()
+with open('test.farc', 'rb') as f:
+    farc = pyfarc.from_stream(f, stats=stats)
+print (stats)
+```
+"""
+
+from time import perf_counter
+
+
+class Stats:
+    """
+    Collects per-stage timings and counters.
+    
+    stages: {stage name: {'calls': n, 'time': seconds, 'bytes_in': n, 'bytes_out': n}}
+    counters: {name: n} (eg. entries)
+    peaks: {name: largest size seen} (eg. buffer sizes)
+    
+    Set callback to a function taking (stage, seconds, bytes_in, bytes_out) to be called after every stage.
+    """
+    
+    def __init__(self, callback=None):
+        self.stages = {}
+        self.counters = {}
+        self.peaks = {}
+        self.callback = callback
+    
+    def add(self, stage, start, bytes_in=0, bytes_out=0):
+        """Records a stage that started at start (from time.perf_counter()) and just finished."""
+        
+        elapsed = perf_counter() - start
+        
+        s = self.stages.get(stage)
+        if not s:
+            s = self.stages[stage] = {'calls': 0, 'time': 0.0, 'bytes_in': 0, 'bytes_out': 0}
+        s['calls'] += 1
+        s['time'] += elapsed
+        s['bytes_in'] += bytes_in
+        s['bytes_out'] += bytes_out
+        
+        if self.callback:
+            self.callback(stage, elapsed, bytes_in, bytes_out)
+    
+    def count(self, name, n=1):
+        """Adds n to a counter."""
+        
+        self.counters[name] = self.counters.get(name, 0) + n
+    
+    def peak(self, name, size):
+        """Records size if it's the largest seen for name."""
+        
+        if size > self.peaks.get(name, 0):
+            self.peaks[name] = size
+    
+    def to_dict(self):
+        """Returns a dictionary of stages, counters and peaks."""
+        
+        return {'stages': {k: dict(v) for k, v in self.stages.items()}, 'counters': dict(self.counters), 'peaks': dict(self.peaks)}
+    
+    def __str__(self):
+        lines = ['{:<16}{:>8}{:>12}{:>14}{:>14}'.format('stage', 'calls', 'time (ms)', 'bytes in', 'bytes out')]
+        for stage, s in self.stages.items():
+            lines += ['{:<16}{:>8}{:>12.3f}{:>14}{:>14}'.format(stage, s['calls'], s['time'] * 1000, s['bytes_in'], s['bytes_out'])]
+        for name, n in self.counters.items():
+            lines += ['{}: {}'.format(name, n)]
+        for name, size in self.peaks.items():
+            lines += ['peak {}: {}'.format(name, size)]
+        return '\n'.join(lines)
@@ -0,0 +1,52 @@
+import unittest
+from os.path import join as joinpath
+import tempfile
+import asyncio
+from io import BytesIO
+from pydiva import pyfarc, pyfmh3
+from pydiva import aio
+from tests.test_farc import farc_bytes_from_files, customdata, module_dir
+
+
+class TestAio(unittest.TestCase):
+    
+    def test_aio_farc(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            with open(path, 'wb') as f:
+                f.write(farc_bytes_from_files(customdata, 'FARC_FT', 16, True, True))
+            
+            async def _test():
+                table = await aio.open_farc(path)
+                files = await aio.extract_all(path, table)
+                entry = await aio.read_entry(path, customdata[0][0])
+                whitelisted = await aio.extract_all(path, files_whitelist=[customdata[0][0]])
+                return files, entry, whitelisted
+            
+            files, entry, whitelisted = asyncio.run(_test())
+            self.assertEqual(sorted(files.items()), customdata)
+            self.assertEqual(entry, customdata[0][1])
+            self.assertEqual(whitelisted, {customdata[0][0]: customdata[0][1]})
+    
+    def test_aio_truncated(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            b = farc_bytes_from_files(customdata, 'FARC_FT', 16, True, True)
+            info = max(pyfarc.table_from_stream(BytesIO(b))['files'].values(), key=lambda info: (info['stored_size'] > 0, info['pointer']))
+            with open(path, 'wb') as f:
+                f.write(b[:info['pointer'] + info['stored_size'] - 1])
+            
+            with self.assertRaises(EOFError):
+                asyncio.run(aio.extract_all(path))
+    
+    def test_aio_fontmap(self):
+        async def _test():
+            return await asyncio.gather(
+                aio.load_fontmap(joinpath(module_dir, 'data', 'fontmap_aft', 'fontmap.bin')),
+                aio.load_fontmap(joinpath(module_dir, 'data', 'fontmap_aft.farc'), 'fontmap.bin'),
+            )
+        
+        from_file, from_farc = asyncio.run(_test())
+        with open(joinpath(module_dir, 'data', 'fontmap_aft', 'fontmap.bin'), 'rb') as f:
+            self.assertEqual(from_file, pyfmh3.from_stream(f))
+        self.assertEqual(from_farc, from_file)
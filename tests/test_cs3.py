@@ -0,0 +1,135 @@
+import unittest
+from os.path import join as joinpath, dirname
+import json
+from pydiva import pyfarc, pyfmh3
+from construct import Int32ul, Int64ul
+from pydiva.pyfmh3_formats import _fmh3_types
+from pydiva.util import cs3_file_utils, cs3_section_walker
+from tests.test_fmh3 import fonm_bytes_from_construct
+
+module_dir = dirname(__file__)
+
+with open(joinpath(module_dir, 'data', 'fontmap_ref_json.farc'), 'rb') as f:
+    refdata = {fname: info['data'] for fname, info in pyfarc.from_stream(f)['files'].items()}
+
+
+class TestRelocation(unittest.TestCase):
+    
+    def test_relocation_data_encoding(self):
+        offsets = [2, 3, 3 + 0x3f, 3 + 0x3f + 0x40, 3 + 0x3f + 0x40 + 0x3ff, 3 + 0x3f + 0x40 + 0x3ff + 0x400]
+        data = cs3_file_utils.gen_relocation_data(offsets)
+        self.assertEqual(data, b'\x0f\x00\x00\x00' + b'\x42\x41\x7f\x80\x40\x83\xff\xc0\x00\x04\x00' + b'\x00')
+        self.assertEqual(cs3_file_utils.relocation_data_len(offsets), len(data))
+    
+    def test_relocation_builder(self):
+        offsets = list(range(0, 300000, 3)) + [5, 100000, 1]
+        builder = cs3_file_utils.RelocationTableBuilder()
+        for o in reversed(offsets):
+            builder.add(o)
+        
+        data = cs3_file_utils.gen_relocation_data(sorted(offsets))
+        self.assertEqual(builder.data(), data)
+        self.assertEqual(cs3_file_utils.relocation_data_len(builder), len(data))
+        self.assertEqual(cs3_file_utils.relocation_data_len(sorted(offsets)), len(data))
+    
+    def test_relocation_parse(self):
+        for fname, path, pointer_size, first_offsets in [('fontmap_x.json', ('fontmap_x', 'fontmap.fnm'), 8, [16, 32, 40]), ('fontmap_f2.json', ('fontmap_f2', 'fontmap.fnm'), 4, [76, 96, 100])]:
+            with open(joinpath(module_dir, 'data', *path), 'rb') as f:
+                b = f.read()
+            fmh = json.loads(refdata[fname])
+            
+            parsed = _fmh3_types[fmh['fmh3_type']]['struct'].parse(b, validate_relocation=True)
+            offsets = parsed['FONM']['section_outer']['section']['extra_sections']['POF']['data']
+            self.assertEqual(offsets.tolist()[:3], first_offsets)
+            self.assertEqual(len(offsets), 1 + 2 * len(fmh['fonts']))
+            pof_data = b.index(b'POF') + 32
+            relocation_data = cs3_file_utils.gen_relocation_data([o // pointer_size for o in offsets])
+            self.assertEqual(relocation_data, b[pof_data:pof_data + len(relocation_data)])
+            
+            self.assertEqual(pyfmh3.from_bytes(b, validate_relocation=True), fmh)
+    
+    def test_relocation_validate_mismatch(self):
+        with open(joinpath(module_dir, 'data', 'fontmap_x', 'fontmap.fnm'), 'rb') as f:
+            b = bytearray(f.read())
+        pof_data = b.index(b'POF1') + 32
+        b[pof_data + 5] = 0x43 # move second pointer
+        
+        pyfmh3.from_bytes(bytes(b)) # doesn't validate by default
+        with self.assertRaises(cs3_file_utils.RelocationMismatchException):
+            pyfmh3.from_bytes(bytes(b), validate_relocation=True)
+
+
+class TestSectionWalker(unittest.TestCase):
+    
+    def test_section_headers(self):
+        with open(joinpath(module_dir, 'data', 'fontmap_x', 'fontmap.fnm'), 'rb') as f:
+            b = f.read()
+        
+        sections = list(cs3_section_walker.iter_section_headers(b))
+        self.assertEqual([s['signature'] for s in sections], ['FONM', 'POF1', 'EOFC', 'EOFC'])
+        self.assertEqual([s['offset'] for s in sections], [0, 0x1a480, 0x1a4c0, 0x1a4e0])
+        self.assertEqual(bytes(sections[0]['data'][:4]), b'FMH3')
+        self.assertEqual(sections[0]['data_size'], 0x1a440)
+        self.assertFalse(sections[0]['big_endian'])
+    
+    def test_section_tree(self):
+        fmh = json.loads(refdata['fontmap_f2.json'])
+        b = bytearray(pyfmh3.to_bytes(fmh))
+        
+        tree = cs3_section_walker.get_section_tree(b)
+        self.assertEqual(len(tree), 1)
+        fonm = cs3_section_walker.find_section(tree, ['FONM'])
+        self.assertTrue(fonm['big_endian'])
+        self.assertEqual(fonm['relocation']['signature'], 'POF0')
+        self.assertEqual(fonm['eofc']['offset'], fonm['relocation']['data_offset'] + fonm['relocation']['data_size'])
+        self.assertEqual(cs3_file_utils.parse_relocation_data(fonm['relocation']['data'], 4)[0], 76)
+        self.assertIsNone(cs3_section_walker.find_section(tree, ['FONM', 'CHLD']))
+        
+        # data is a view, not a copy
+        b[fonm['data_offset']] = ord('X')
+        self.assertEqual(bytes(fonm['data'][:4]), b'XMH3')
+    
+    def test_section_tree_children(self):
+        b = bytearray()
+        b += cs3_file_utils.gen_section_header('MAIN', 0, 32, 0, 16) + b'main data'.ljust(16, b'\x00')
+        b += cs3_file_utils.gen_relocation_section([1, 2], 4, 0)
+        b += cs3_file_utils.gen_section_header('CHLD', 0, 32, 1, 5) + b'child'.ljust(16, b'\x00') # unaligned data_size
+        b += cs3_file_utils.gen_eofc_section(1)
+        b += cs3_file_utils.gen_eofc_section(0)
+        b += cs3_file_utils.gen_eofc_section(0)
+        
+        tree = cs3_section_walker.get_section_tree(b)
+        self.assertEqual([s['signature'] for s in tree], ['MAIN'])
+        child = cs3_section_walker.find_section(tree, ['MAIN', 'CHLD'])
+        self.assertEqual(bytes(child['data']), b'child')
+        self.assertEqual(child['depth'], 1)
+        self.assertIsNotNone(child['eofc'])
+        self.assertIsNotNone(tree[0]['eofc'])
+        self.assertEqual(tree[0]['relocation']['signature'], 'POF0')
+
+
+class TestStructCache(unittest.TestCase):
+    
+    def test_struct_cache(self):
+        data_size = lambda this: this.data_size
+        sections = [{'signature': 'MAIN', 'data_size': data_size, 'relocation': True, 'child_sections': [{'signature': 'CHLD', 'enrs': True}]}]
+        
+        a = cs3_file_utils.gen_cs3_file(Int32ul, Int64ul, sections)
+        self.assertIs(cs3_file_utils.gen_cs3_file(Int32ul, Int64ul, [dict(s) for s in sections]), a) # equal spec is enough
+        self.assertIs(cs3_file_utils.precompile_cs3_file(Int32ul, Int64ul, sections), a)
+        self.assertIsNot(cs3_file_utils.gen_cs3_file(Int32ul, Int32ul, sections), a)
+        self.assertIsNot(cs3_file_utils.gen_cs3_file(Int32ul, Int64ul, [dict(sections[0], enrs=True)]), a)
+        
+        cs3_file_utils.clear_struct_cache()
+        self.assertIsNot(cs3_file_utils.gen_cs3_file(Int32ul, Int64ul, sections), a)
+    
+    def test_struct_cache_bounded(self):
+        cs3_file_utils.clear_struct_cache()
+        for i in range(200):
+            cs3_file_utils.gen_cs3_file(Int32ul, Int64ul, [{'signature': 'MAIN', 'data_size': lambda this: this.data_size}]) # new lambda every time
+        self.assertLessEqual(len(cs3_file_utils._struct_cache), cs3_file_utils._struct_cache_max_size)
+    
+    def test_struct_cache_build(self):
+        # cached structs must still build correctly when reused
+        fmh = json.loads(refdata['fontmap_x.json'])
+        self.assertEqual(fonm_bytes_from_construct(fmh), fonm_bytes_from_construct(fmh))
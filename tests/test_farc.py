@@ -3,13 +3,21 @@ from os import listdir, environ
 from os.path import join as joinpath, dirname
 import json
 import hashlib
+import tempfile
+import shutil
+import subprocess
+import contextlib
+from io import StringIO, BytesIO
+import sys
 from collections import namedtuple
 from pydiva import pyfarc
-from pydiva.farc_load_helper import farc_load_helper
+from pydiva.farc_load_helper import farc_load_helper, farc_load_many
+from pydiva import pyfarc_ft_helpers
 
 environ['PYFARC_NULL_IV'] = '1'
 
-cli_args = namedtuple('args', ['type', 'compress', 'encrypt', 'alignment', 'null_iv', 'force', 'silent', 'input'])
+# defaults match the command line's (except silent), so tests only need to set what they use
+cli_args = namedtuple('args', ['type', 'compress', 'encrypt', 'alignment', 'null_iv', 'force', 'silent', 'input', 'verify', 'stats', 'list', 'include', 'exclude', 'iv_mode', 'diff'], defaults=['FArC', False, False, '16', False, False, True, None, False, False, False, None, None, None, None])
 
 def files_from_dir(path):
     """Returns list of (filename, bytes) tuples containing all files in path."""
@@ -219,6 +227,39 @@ class TestFarcLoadWhitelist(unittest.TestCase):
         self.assertEqual(farc['files'], {'zero-length': {'data': b''}})
 
 
+class SeekCountingBytesIO(BytesIO):
+    def __init__(self, *args):
+        super().__init__(*args)
+        self.seek_count = 0
+    
+    def seek(self, *args):
+        self.seek_count += 1
+        return super().seek(*args)
+
+class TestFarcSeeks(unittest.TestCase):
+    
+    # table parsing shouldn't seek per entry (expensive on network filesystems etc.)
+    
+    def _count_seeks(self, entry_count, files_whitelist):
+        files = [('{:05}'.format(i), b'file data') for i in range(entry_count)]
+        b = farc_bytes_from_files(files, 'FARC_FT', 16, False, False)
+        with SeekCountingBytesIO(b) as s:
+            farc = pyfarc.from_stream(s, files_whitelist=files_whitelist)
+            return s.seek_count, farc
+    
+    def test_table_seeks_constant(self):
+        seeks_small, farc = self._count_seeks(10, ['none'])
+        seeks_large, farc = self._count_seeks(1000, ['none'])
+        self.assertEqual(farc['files'], {})
+        self.assertEqual(seeks_small, seeks_large)
+    
+    def test_data_seeks(self):
+        seeks_table, farc = self._count_seeks(1000, ['none'])
+        seeks_all, farc = self._count_seeks(1000, None)
+        self.assertEqual(len(farc['files']), 1000)
+        self.assertLessEqual(seeks_all - seeks_table, 1000) # at most one seek to reach each file's data
+
+
 class TestFarcHelper(unittest.TestCase):
     
     def test_farc_helper_success(self):
@@ -237,12 +278,34 @@ class TestFarcHelper(unittest.TestCase):
             farc_file = farc_load_helper(f, ['dummy.bin'])
         self.assertEqual(farc_file, [])
     
+    def test_farc_helper_no_whitelist(self):
+        with open(joinpath(module_dir, 'data', 'fontmap_ref_json.farc'), 'rb') as f:
+            all_files = [(fname, info['data']) for fname, info in pyfarc.from_stream(f)['files'].items()]
+            for filenames in [[], None]:
+                f.seek(0)
+                self.assertEqual(farc_load_helper(f, filenames), all_files)
+    
     def test_farc_helper_fail_not_farc(self):
         with open(joinpath(module_dir, 'data', 'files.txt'), 'rb') as f:
             farc_file = farc_load_helper(f, ['dummy.bin'])
             f.seek(0)
             original_bytes = f.read()
         self.assertEqual(farc_file, [(None, original_bytes)])
+    
+    def test_farc_load_many(self):
+        with open(joinpath(module_dir, 'data', 'files.txt'), 'rb') as f:
+            original_bytes = f.read()
+        with open(joinpath(module_dir, 'data', 'fontmap_ref_json.farc'), 'rb') as f:
+            requests = [
+                (joinpath(module_dir, 'data', 'fontmap_aft.farc'), ['fontmap.bin']),
+                (joinpath(module_dir, 'data', 'files.txt'), ['dummy.bin']),
+                (f, ['fontmap_aft.json', 'fontmap_x.json', 'dummy.bin']),
+            ]
+            for workers in [1, 4]:
+                res = sorted(farc_load_many(requests, workers=workers), key=lambda r: (r[0], r[1]))
+                self.assertEqual([(i, fname) for i, fname, data in res], [(0, 'fontmap.bin'), (1, None), (2, 'fontmap_aft.json'), (2, 'fontmap_x.json')])
+                self.assertEqual(res[0][2], files_from_dir(joinpath(module_dir, 'data', 'fontmap_aft'))[0][1])
+                self.assertEqual(res[1][2], original_bytes)
 
 
 class TestFarcCli(unittest.TestCase):
@@ -263,10 +326,289 @@ class TestFarcCli(unittest.TestCase):
         c = hashlib.sha1(b).hexdigest()
         self.assertEqual(c, checksums['cli_pack_c_e.farc'])
     
+    def test_pack_derived_iv(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            input = joinpath(tmp, 'cli_pack_c_e')
+            shutil.copytree(joinpath(module_dir, 'data', 'cli_pack_c_e'), input)
+            a = cli_args(type='FARC_FT', compress=True, encrypt=True, force=True, input=input, iv_mode='derived')
+            out = []
+            for i in range(2):
+                pyfarc._main(a)
+                with open(input + '.farc', 'rb') as f:
+                    out += [f.read()]
+        self.assertEqual(out[0], out[1])
+        self.assertNotEqual(hashlib.sha1(out[0]).hexdigest(), checksums['cli_pack_c_e.farc'])
+    
     def test_unpack(self):
         a = cli_args(type='FArC', compress=False, encrypt=False, alignment='16', null_iv=False, force=True, silent=True, input=joinpath(module_dir, 'data', 'cli_unpack.farc'))
         pyfarc._main(a)
         with open(joinpath(module_dir, 'data', 'cli_unpack', 'fontmap.bin'), 'rb') as f:
             b = f.read()
         c = hashlib.sha1(b).hexdigest()
-        self.assertEqual(c, checksums['fontmap_aft.bin'])
\ No newline at end of file
+        self.assertEqual(c, checksums['fontmap_aft.bin'])
+    
+    def test_verify(self):
+        a = cli_args(input=joinpath(module_dir, 'data', 'cli_unpack.farc'), verify=True)
+        with self.assertRaises(SystemExit) as cm:
+            pyfarc._main(a)
+        self.assertEqual(cm.exception.code, 0)
+    
+    def test_diff(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(module_dir, 'data', 'cli_unpack.farc')
+            other = joinpath(d, 'other.farc')
+            with open(other, 'wb') as f:
+                f.write(farc_bytes_from_files(customdata, 'FArC'))
+            for other, code in [(path, 0), (other, 1)]:
+                a = cli_args(input=path, diff=other)
+                with self.assertRaises(SystemExit) as cm:
+                    pyfarc._main(a)
+                self.assertEqual(cm.exception.code, code)
+    
+    def test_list(self):
+        a = cli_args(input=joinpath(module_dir, 'data', 'cli_unpack.farc'), list=True)
+        out = StringIO()
+        with contextlib.redirect_stdout(out):
+            pyfarc._main(a)
+        names = [line.split()[-1] for line in out.getvalue().splitlines()[1:]]
+        self.assertEqual(sorted(names), [fname for fname, data in files_from_dir(joinpath(module_dir, 'data', 'cli_unpack'))])
+    
+    def test_unpack_filtered(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            with open(path, 'wb') as f:
+                f.write(farc_bytes_from_files([('a.txt', b'a'), ('b.txt', b'b'), ('c.bin', b'c')], 'FARC_FT', 16, True, True))
+            
+            a = cli_args(force=True, input=path, include=['*.txt'], exclude=['b*'])
+            pyfarc._main(a)
+            self.assertEqual(files_from_dir(joinpath(d, 'a')), [('a.txt', b'a')])
+            
+            # existing files aren't removed when extracting selectively
+            pyfarc._main(a._replace(include=['c.bin'], exclude=None))
+            self.assertEqual(files_from_dir(joinpath(d, 'a')), [('a.txt', b'a'), ('c.bin', b'c')])
+
+
+class TestFarcVerify(unittest.TestCase):
+    
+    def test_verify(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            for farc_type in ['FArc', 'FArC', 'FARC', 'FARC_FT']:
+                with self.subTest(farc_type=farc_type):
+                    with open(path, 'wb') as f:
+                        f.write(farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC'))
+                    report = pyfarc.verify(path, workers=2, hash_name='sha256', chunk_size=64)
+                    self.assertTrue(report['ok'])
+                    for fname, data in customdata:
+                        self.assertEqual(report['files'][fname]['size'], len(data))
+                        self.assertEqual(report['files'][fname]['hash'], hashlib.sha256(data).hexdigest())
+    
+    def test_verify_unaligned_chunk_size(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            for farc_type in ['FARC', 'FARC_FT']:
+                with self.subTest(farc_type=farc_type):
+                    with open(path, 'wb') as f:
+                        f.write(farc_bytes_from_files(customdata, farc_type, 16, True, True))
+                    for workers in [1, 2]:
+                        self.assertTrue(pyfarc.verify(path, workers=workers, chunk_size=100)['ok'])
+                    with self.assertRaises(ValueError):
+                        pyfarc.verify(path, chunk_size=0)
+    
+    def test_verify_corrupt(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            b = bytearray(farc_bytes_from_files(customdata, 'FARC', 16, True, False))
+            info = pyfarc.table_from_stream(BytesIO(b))['files']['medium.txt']
+            b[info['pointer'] + info['stored_size'] - 5] ^= 1 # in gzip CRC32
+            with open(path, 'wb') as f:
+                f.write(b[:-1])
+            
+            report = pyfarc.verify(path)
+            self.assertFalse(report['ok'])
+            self.assertFalse(report['files']['medium.txt']['ok'])
+            self.assertEqual(report['files']['short.txt']['errors'], ['data ends after end of archive'])
+            self.assertTrue(report['files']['zero-length']['ok'])
+
+
+class TestFarcTable(unittest.TestCase):
+    
+    def test_table_and_file_from_stream(self):
+        for farc_type in ['FArc', 'FArC', 'FARC', 'FARC_FT']:
+            b = farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC')
+            with BytesIO(b) as s:
+                table = pyfarc.table_from_stream(s)
+                self.assertEqual(s.tell(), 0)
+                self.assertEqual(sorted(table['files']), [fname for fname, data in customdata])
+                for fname, data in customdata:
+                    self.assertEqual(table['files'][fname]['uncompressed_size'], len(data))
+                    self.assertEqual(pyfarc.file_from_stream(s, table, fname), data)
+    
+    def test_read_entry_into(self):
+        for farc_type, compress, encrypt in [('FArc', False, False), ('FArC', True, False), ('FARC', False, True), ('FARC', True, True), ('FARC_FT', False, True), ('FARC_FT', True, True)]:
+            with self.subTest(farc_type=farc_type, compress=compress, encrypt=encrypt):
+                b = farc_bytes_from_files(customdata, farc_type, 16, compress, encrypt)
+                with BytesIO(b) as s:
+                    table = pyfarc.table_from_stream(s)
+                    for fname, data in customdata:
+                        buf = bytearray(len(data) + 3)
+                        self.assertEqual(pyfarc.read_entry_into(s, table, fname, memoryview(buf)), len(data))
+                        self.assertEqual(bytes(buf[:len(data)]), data)
+                        self.assertEqual(s.tell(), 0)
+                    
+                    with self.assertRaises(ValueError):
+                        pyfarc.read_entry_into(s, table, 'medium.txt', bytearray(10))
+    
+    def test_truncated(self):
+        for farc_type in ['FArc', 'FArC', 'FARC', 'FARC_FT']:
+            with self.subTest(farc_type=farc_type):
+                b = farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC')
+                info = max(pyfarc.table_from_stream(BytesIO(b))['files'].items(), key=lambda f: (f[1]['stored_size'] > 0, f[1]['pointer']))
+                b = b[:info[1]['pointer'] + info[1]['stored_size'] - 1] # cut into the last file's data
+                
+                with BytesIO(b) as s:
+                    table = pyfarc.table_from_stream(s)
+                    with self.assertRaises(EOFError):
+                        pyfarc.from_stream(s)
+                    with self.assertRaises(EOFError):
+                        pyfarc.file_from_stream(s, table, info[0])
+
+
+
+class ForwardOnlyStream:
+    """Non-seekable stream that returns short reads, like a pipe."""
+    
+    def __init__(self, b, max_read=100):
+        self._s = BytesIO(b)
+        self._max_read = max_read
+    
+    def read(self, size=-1):
+        return self._s.read(min(size, self._max_read) if size >= 0 else self._max_read)
+    
+    def seekable(self):
+        return False
+
+
+class WriteOnlyStream(BytesIO):
+    """Stream that can't seek or read, like a pipe."""
+    
+    def seek(self, *args):
+        raise OSError('not seekable')
+    
+    def tell(self):
+        raise OSError('not seekable')
+    
+    def read(self, *args):
+        raise OSError('not readable')
+    
+    def seekable(self):
+        return False
+
+
+class TestFarcForwardOnly(unittest.TestCase):
+    
+    def test_iter_from_stream(self):
+        for farc_type in ['FArc', 'FArC', 'FARC', 'FARC_FT']:
+            with self.subTest(farc_type=farc_type):
+                b = farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC')
+                files = list(pyfarc.iter_from_stream(ForwardOnlyStream(b)))
+                self.assertEqual(sorted(files), customdata)
+                
+                whitelist = [customdata[-1][0]]
+                self.assertEqual(list(pyfarc.iter_from_stream(ForwardOnlyStream(b), whitelist, skip_chunk_size=7)), customdata[-1:])
+    
+    def test_to_stream_unseekable(self):
+        for farc_type in ['FArc', 'FArC', 'FARC', 'FARC_FT']:
+            with self.subTest(farc_type=farc_type):
+                b = farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC')
+                out = WriteOnlyStream()
+                pyfarc.to_stream(pyfarc.from_bytes(b), out)
+                self.assertEqual(out.getvalue(), b)
+    
+    def test_iter_from_stream_truncated(self):
+        b = farc_bytes_from_files(customdata, 'FARC', 16)
+        with self.assertRaises(EOFError):
+            list(pyfarc.iter_from_stream(ForwardOnlyStream(b[:-1])))
+
+
+class TestLazyImport(unittest.TestCase):
+    
+    def test_pyfarc_import_is_light(self):
+        for module in ['pydiva.pyfarc', 'pydiva.pyfmh3']:
+            with self.subTest(module=module):
+                code = "import sys, {}; print (','.join(m for m in ['construct', 'Cryptodome'] if m in sys.modules))".format(module)
+                out = subprocess.run([sys.executable, '-c', code], capture_output=True, check=True, text=True, cwd=joinpath(module_dir, '..')).stdout
+                self.assertEqual(out.strip(), '')
+    
+    def test_structs_generated_on_use(self):
+        from pydiva.pyfarc_formats import _farc_types
+        self.assertIsNotNone(_farc_types['FArC']['table_struct'])
+        with self.assertRaises(KeyError):
+            _farc_types['FArC']['missing']
+
+
+class TestFarcIvMode(unittest.TestCase):
+    
+    def _to_bytes(self, files, iv_mode):
+        return pyfarc.to_bytes({'farc_type': 'FARC', 'format': 1, 'flags': {'encrypted': True, 'compressed': True}, 'files': {fname: {'data': data} for fname, data in files}}, iv_mode=iv_mode)
+    
+    def test_derived(self):
+        b = self._to_bytes(customdata, 'derived')
+        self.assertEqual(b, self._to_bytes(customdata, 'derived'))
+        self.assertEqual(files_from_farc_bytes(b), sorted(customdata))
+        
+        changed = [(fname, data + b'!' if fname == customdata[0][0] else data) for fname, data in customdata]
+        b_changed = self._to_bytes(changed, 'derived')
+        self.assertNotEqual(b, b_changed)
+        self.assertEqual(files_from_farc_bytes(b_changed), sorted(changed))
+        
+        # unchanged files have the same stored data
+        with BytesIO(b) as s:
+            table = pyfarc.table_from_stream(s)
+            with BytesIO(b_changed) as s_changed:
+                table_changed = pyfarc.table_from_stream(s_changed)
+                for fname, data in customdata[1:]:
+                    info, info_changed = table['files'][fname], table_changed['files'][fname]
+                    self.assertEqual(b[info['pointer']:info['pointer'] + info['stored_size']], b_changed[info_changed['pointer']:info_changed['pointer'] + info_changed['stored_size']])
+    
+    def test_random_and_null(self):
+        self.assertNotEqual(self._to_bytes(customdata, 'random'), self._to_bytes(customdata, 'random'))
+        self.assertEqual(self._to_bytes(customdata, 'null'), self._to_bytes(customdata, None)) # PYFARC_NULL_IV is set
+        with self.assertRaises(ValueError):
+            self._to_bytes(customdata, 'zero')
+
+
+class TestParallelDecrypt(unittest.TestCase):
+    
+    def setUp(self):
+        self._settings = (pyfarc_ft_helpers._parallel_decrypt_threshold, pyfarc_ft_helpers._parallel_decrypt_chunk_size, pyfarc_ft_helpers._parallel_decrypt_workers)
+        pyfarc_ft_helpers._parallel_decrypt_threshold = 64
+        pyfarc_ft_helpers._parallel_decrypt_chunk_size = 32
+        pyfarc_ft_helpers._parallel_decrypt_workers = 4
+    
+    def tearDown(self):
+        pyfarc_ft_helpers._parallel_decrypt_threshold, pyfarc_ft_helpers._parallel_decrypt_chunk_size, pyfarc_ft_helpers._parallel_decrypt_workers = self._settings
+    
+    def test_cbc_decrypt(self):
+        from Cryptodome.Cipher import AES
+        key, iv = b'k' * 16, b'i' * 16
+        for size in [0, 16, 64, 80, 1008]:
+            data = bytes(range(256)) * 4
+            encrypted = AES.new(key, AES.MODE_CBC, iv=iv).encrypt(data[:size])
+            self.assertEqual(pyfarc_ft_helpers._cbc_decrypt(key, iv, encrypted), data[:size])
+            
+            buf = bytearray(encrypted)
+            pyfarc_ft_helpers._cbc_decrypt(key, iv, buf, output=buf)
+            self.assertEqual(bytes(buf), data[:size])
+    
+    def test_FARC_FT(self):
+        files = [('big', customdata[0][1] * 10)] + customdata
+        for compress in [False, True]:
+            b = farc_bytes_from_files(files, 'FARC_FT', 16, compress, True)
+            self.assertEqual(files_from_farc_bytes(b), sorted(files))
+            self.assertTrue(all(type(data) is bytes for fname, data in files_from_farc_bytes(b)))
+            with BytesIO(b) as s:
+                table = pyfarc.table_from_stream(s)
+                buf = bytearray(len(files[0][1]))
+                pyfarc.read_entry_into(s, table, 'big', buf)
+                self.assertEqual(bytes(buf), files[0][1])
@@ -0,0 +1,87 @@
+import unittest
+from os import utime
+from os.path import join as joinpath
+import tempfile
+from pydiva import pyfarc
+from pydiva.farc_load_helper import farc_load_helper
+from pydiva.farc_overlay import ArchiveOverlay
+from pydiva.farc_cache import EntryCache
+from tests.test_farc import farc_bytes_from_files, module_dir
+
+
+class TestFarcCache(unittest.TestCase):
+    
+    def test_cache(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'a.farc')
+            with open(path, 'wb') as f:
+                f.write(farc_bytes_from_files([('x', b'x' * 100), ('y', b'y' * 100), ('z', b'z' * 300)], 'FARC_FT', 16, True, True))
+            
+            cache = EntryCache(max_bytes=250)
+            self.assertEqual(cache.get(path, 'x'), b'x' * 100)
+            self.assertEqual(cache.get(path, 'x'), b'x' * 100)
+            self.assertEqual(cache.get(path, 'y'), b'y' * 100)
+            self.assertEqual(cache.get(path, 'z'), b'z' * 300) # too big to cache
+            self.assertEqual(cache.stats(), {'hits': 1, 'misses': 3, 'evictions': 0, 'entries': 2, 'bytes': 200, 'max_bytes': 250})
+            
+            cache.max_bytes = 50
+            cache.get_or_load('other', lambda: b'o' * 10) # evicts x then y
+            self.assertEqual(cache.stats()['evictions'], 2)
+            self.assertEqual(len(cache), 1)
+            with self.assertRaises(KeyError):
+                cache.get(path, 'missing')
+            
+            # changed archives aren't read from cache
+            with open(path, 'wb') as f:
+                f.write(farc_bytes_from_files([('x', b'new')], 'FArc', 16))
+            utime(path, ns=(0, 0))
+            with open(path, 'rb') as f:
+                self.assertEqual(farc_load_helper(f, ['x', 'y'], cache=cache), [('x', b'new')])
+            with open(path, 'rb') as f:
+                self.assertEqual(farc_load_helper(f, ['x'], cache=cache), [('x', b'new')])
+            with open(joinpath(module_dir, 'data', 'files.txt'), 'rb') as f:
+                self.assertIsNone(farc_load_helper(f, ['x'], cache=cache)[0][0])
+            for filenames in [[], None]:
+                self.assertEqual(cache.get_many(path, filenames), [('x', b'new')])
+            
+            # streams not at the start of a file aren't loaded through the cache
+            with open(path, 'wb') as f:
+                f.write(b'junk' + farc_bytes_from_files([('x', b'offset')], 'FArc', 16))
+            with open(path, 'rb') as f:
+                f.seek(4)
+                hits = cache.stats()['hits']
+                self.assertEqual(farc_load_helper(f, ['x'], cache=cache), [('x', b'offset')])
+                self.assertEqual(cache.stats()['hits'], hits)
+            with open(path, 'wb') as f:
+                f.write(farc_bytes_from_files([('x', b'new')], 'FArc', 16))
+            utime(path, ns=(0, 0))
+            
+            overlay = ArchiveOverlay([path], cache=cache)
+            hits = cache.stats()['hits']
+            self.assertEqual(overlay.read('x'), b'new')
+            self.assertEqual(cache.stats()['hits'], hits + 1)
+    
+    def test_cache_max_tables(self):
+        with tempfile.TemporaryDirectory() as d:
+            paths = [joinpath(d, '{}.farc'.format(i)) for i in range(3)]
+            for i, path in enumerate(paths):
+                with open(path, 'wb') as f:
+                    f.write(farc_bytes_from_files([('x', str(i).encode())], 'FArc', 16))
+            
+            cache = EntryCache(max_tables=2)
+            for i, path in enumerate(paths):
+                self.assertEqual(cache.get_many(path, None), [('x', str(i).encode())])
+            self.assertEqual(list(cache._tables), paths[1:])
+    
+    def test_cache_binary_non_farc(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = joinpath(d, 'image.png')
+            data = b'\x89PNG\r\n\x1a\n' + bytes(range(256))
+            with open(path, 'wb') as f:
+                f.write(data)
+            
+            cache = EntryCache()
+            with open(path, 'rb') as f:
+                self.assertEqual(farc_load_helper(f, ['x'], cache=cache), [(None, data)])
+            with self.assertRaises(pyfarc.UnsupportedFarcTypeException):
+                cache.get_many(path, ['x'])
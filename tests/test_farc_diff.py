@@ -0,0 +1,64 @@
+import unittest
+from os.path import join as joinpath
+import gzip
+import tempfile
+from io import BytesIO
+from pydiva import pyfarc
+from tests.test_farc import farc_bytes_from_files, customdata
+
+
+class TestFarcDiff(unittest.TestCase):
+    
+    def _write(self, d, name, files, farc_type, compress=True, encrypt=True):
+        path = joinpath(d, name)
+        with open(path, 'wb') as f:
+            f.write(farc_bytes_from_files(files, farc_type, 16, compress, encrypt))
+        return path
+    
+    def test_diff(self):
+        changed = [(fname, data + b'!' if fname == 'medium.txt' else data) for fname, data in customdata if fname != 'zero-length'] + [('new.txt', b'new')]
+        with tempfile.TemporaryDirectory() as d:
+            for farc_type_a, farc_type_b in [('FArc', 'FArc'), ('FArC', 'FArC'), ('FARC', 'FARC'), ('FARC_FT', 'FARC_FT'), ('FArC', 'FARC_FT'), ('FArc', 'FARC')]:
+                with self.subTest(farc_type_a=farc_type_a, farc_type_b=farc_type_b):
+                    a = self._write(d, 'a.farc', customdata, farc_type_a, encrypt=farc_type_a != 'FArC')
+                    b = self._write(d, 'b.farc', customdata, farc_type_b, encrypt=farc_type_b != 'FArC')
+                    result = pyfarc.diff(a, b, chunk_size=64)
+                    self.assertEqual(result['unchanged'], [fname for fname, data in customdata])
+                    self.assertEqual(result['added'] + result['removed'] + result['changed'], [])
+                    
+                    b = self._write(d, 'b.farc', changed, farc_type_b, encrypt=farc_type_b != 'FArC')
+                    result = pyfarc.diff(a, b, chunk_size=64)
+                    self.assertEqual(result['added'], ['new.txt'])
+                    self.assertEqual(result['removed'], ['zero-length'])
+                    self.assertEqual(result['changed'], ['medium.txt'])
+                    self.assertEqual(len(result['unchanged']), len(customdata) - 2)
+    
+    def test_diff_random_iv(self):
+        with tempfile.TemporaryDirectory() as d:
+            paths = []
+            for name in ['a.farc', 'b.farc']:
+                paths += [joinpath(d, name)]
+                with open(paths[-1], 'wb') as f:
+                    pyfarc.to_stream({'farc_type': 'FARC', 'format': 1, 'flags': {'encrypted': True, 'compressed': True}, 'files': {fname: {'data': data} for fname, data in customdata}}, f, iv_mode='random')
+            self.assertEqual(pyfarc.diff(*paths)['unchanged'], [fname for fname, data in customdata])
+    
+    def test_gzip_trailer(self):
+        for farc_type in ['FArC', 'FARC', 'FARC_FT']:
+            with self.subTest(farc_type=farc_type):
+                with BytesIO(farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC')) as s:
+                    table = pyfarc.table_from_stream(s)
+                    for fname, data in customdata:
+                        info = table['files'][fname]
+                        if not info['flags']['compressed'] or (farc_type == 'FARC' and info['compressed_size'] == info['uncompressed_size']):
+                            continue # stored uncompressed
+                        self.assertEqual(pyfarc._gzip_trailer(s, info, pyfarc._table_farc_type(table)), gzip.compress(data)[-8:])
+    
+    def test_diff_many(self):
+        with tempfile.TemporaryDirectory() as d:
+            a = self._write(d, 'a.farc', customdata, 'FArC', encrypt=False)
+            b = self._write(d, 'b.farc', customdata[1:], 'FARC')
+            results = dict(pyfarc.diff_many([(a, a), (a, b), (a, joinpath(d, 'missing.farc'))], workers=2))
+            self.assertEqual(sorted(results), [0, 1, 2])
+            self.assertEqual(len(results[0]['unchanged']), len(customdata))
+            self.assertEqual(results[1]['removed'], [customdata[0][0]])
+            self.assertIsInstance(results[2], Exception)
@@ -0,0 +1,44 @@
+import unittest
+from os import utime
+from os.path import join as joinpath
+import tempfile
+from pydiva import pyfarc
+from pydiva import farc_index
+from pydiva.farc_overlay import ArchiveOverlay
+from tests.test_farc import farc_bytes_from_files, customdata
+
+
+class TestFarcIndex(unittest.TestCase):
+    
+    def test_index(self):
+        with tempfile.TemporaryDirectory() as d:
+            paths = [joinpath(d, '{}.farc'.format(t)) for t in ['FArc', 'FArC', 'FARC', 'FARC_FT']]
+            for path, farc_type in zip(paths, ['FArc', 'FArC', 'FARC', 'FARC_FT']):
+                with open(path, 'wb') as f:
+                    f.write(farc_bytes_from_files(customdata, farc_type, 16, True, farc_type != 'FArC'))
+            index_path = joinpath(d, 'index.sqlite')
+            
+            self.assertEqual(farc_index.update_index(index_path, paths, workers=2), paths)
+            self.assertEqual(farc_index.update_index(index_path, paths), []) # nothing changed
+            
+            index = farc_index.load_index(index_path)
+            for path in paths:
+                with open(path, 'rb') as f:
+                    table = pyfarc.table_from_stream(f)
+                    self.assertEqual(index[path]['table'], table)
+                    for fname, data in customdata:
+                        self.assertEqual(pyfarc.file_from_stream(f, index[path]['table'], fname), data)
+            
+            # changed archives are reindexed, missing ones are removed
+            with open(paths[0], 'wb') as f:
+                f.write(farc_bytes_from_files([('new', b'new')], 'FArc'))
+            utime(paths[0], ns=(0, 0))
+            self.assertEqual(set(farc_index.load_index(index_path)), set(paths[1:]))
+            self.assertEqual(farc_index.update_index(index_path, paths[:2]), [paths[0]])
+            index = farc_index.load_index(index_path, validate=False)
+            self.assertEqual(set(index), set(paths[:2]))
+            self.assertEqual(list(index[paths[0]]['table']['files']), ['new'])
+            
+            overlay = ArchiveOverlay(paths[:2], saved_index=index)
+            self.assertIs(overlay.lookup('new')[1], index[paths[0]]['table']['files']['new'])
+            self.assertEqual(overlay.read('new'), b'new')
@@ -0,0 +1,66 @@
+import unittest
+from os.path import join as joinpath
+import tempfile
+from io import BytesIO
+from pydiva import pyfarc
+from tests.test_farc import files_from_farc_bytes, customdata, ForwardOnlyStream
+
+
+class TestFarcLayout(unittest.TestCase):
+    
+    files = customdata + [('copy.txt', customdata[0][1]), ('a', b'a'), ('bb', b'bb'), ('a2', b'a')]
+    
+    def _to_bytes(self, farc_type, layout):
+        farc = {
+            'farc_type': 'FARC' if farc_type == 'FARC_FT' else farc_type,
+            'format': 1 if farc_type == 'FARC_FT' else 0,
+            'alignment': 16,
+            'flags': {'compressed': True, 'encrypted': farc_type != 'FArC'},
+            'files': {fname: {'data': data} for fname, data in self.files}
+        }
+        with BytesIO() as s:
+            report = pyfarc.to_stream(farc, s, layout=layout, iv_mode='derived')
+            return s.getvalue(), report
+    
+    def _check(self, b):
+        self.assertEqual(files_from_farc_bytes(b), sorted(self.files))
+        self.assertEqual(sorted(pyfarc.iter_from_stream(ForwardOnlyStream(b))), sorted(self.files))
+        self.assertEqual(list(pyfarc.table_from_stream(BytesIO(b))['files']), [fname for fname, data in self.files])
+        with tempfile.TemporaryDirectory() as d:
+            with open(joinpath(d, 'a.farc'), 'wb') as f:
+                f.write(b)
+            self.assertTrue(pyfarc.verify(joinpath(d, 'a.farc'))['ok'])
+    
+    def test_compact(self):
+        for farc_type in ['FArc', 'FArC', 'FARC', 'FARC_FT']:
+            with self.subTest(farc_type=farc_type):
+                b_default, report_default = self._to_bytes(farc_type, None)
+                b, report = self._to_bytes(farc_type, 'compact')
+                self.assertEqual(report['size'], len(b))
+                self.assertEqual(report_default['size'], len(b_default))
+                self.assertLessEqual(report['padding'], report_default['padding'])
+                if farc_type == 'FARC_FT':
+                    self.assertEqual(report['shared'], 0) # data has per-file IVs
+                else:
+                    self.assertEqual(report['shared'], 2)
+                    self.assertLess(len(b), len(b_default))
+                self._check(b)
+    
+    def test_access_profile(self):
+        profile = ['bb', 'medium.txt', 'missing', 'a']
+        for farc_type in ['FArC', 'FARC_FT']:
+            with self.subTest(farc_type=farc_type):
+                b, report = self._to_bytes(farc_type, profile)
+                self.assertEqual(report['seeks'], 0)
+                self.assertEqual(report['shared'], 0)
+                table = pyfarc.table_from_stream(BytesIO(b))
+                pointers = [table['files'][fname]['pointer'] for fname in ['bb', 'medium.txt', 'a']]
+                self.assertEqual(pointers, sorted(pointers))
+                self._check(b)
+        
+        self.assertEqual(self._to_bytes('FArC', None)[1]['seeks'], 0)
+        self.assertGreater(self._to_bytes('FArC', 'compact')[1]['seeks'], 0) # dictionary order isn't storage order
+    
+    def test_bad_layout(self):
+        with self.assertRaises(ValueError):
+            self._to_bytes('FArC', 'smallest')
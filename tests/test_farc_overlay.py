@@ -0,0 +1,41 @@
+import unittest
+from os import utime
+from os.path import join as joinpath
+import tempfile
+from pydiva.farc_overlay import ArchiveOverlay
+from tests.test_farc import farc_bytes_from_files, customdata, module_dir
+
+
+class TestFarcOverlay(unittest.TestCase):
+    
+    def test_overlay(self):
+        with tempfile.TemporaryDirectory() as d:
+            with open(joinpath(d, 'a.farc'), 'wb') as f:
+                f.write(farc_bytes_from_files([('x', b'a_x'), ('y', b'a_y')], 'FARC_FT', 16, True, True))
+            with open(joinpath(d, 'b.farc'), 'wb') as f:
+                f.write(farc_bytes_from_files([('y', b'b_y'), ('z', b'b_z')], 'FArC', 16))
+            
+            overlay = ArchiveOverlay([joinpath(d, 'a.farc'), joinpath(d, 'b.farc'), joinpath(module_dir, 'data', 'customdata')])
+            self.assertEqual(sorted(overlay), sorted(['x', 'y', 'z'] + [fname for fname, data in customdata]))
+            self.assertEqual(overlay.read('x'), b'a_x')
+            self.assertEqual(overlay.read('y'), b'b_y') # b overrides a
+            buf = bytearray(3)
+            self.assertEqual(overlay.read_into('x', buf), 3)
+            self.assertEqual(buf, b'a_x')
+            self.assertEqual(overlay.lookup('y')[0], joinpath(d, 'b.farc'))
+            self.assertEqual(overlay.lookup('zero-length'), (joinpath(module_dir, 'data', 'customdata'), None))
+            self.assertIsNone(overlay.lookup('missing'))
+            with self.assertRaises(KeyError):
+                overlay.read('missing')
+            
+            self.assertEqual(overlay.refresh(), [])
+            
+            with open(joinpath(d, 'b.farc'), 'wb') as f:
+                f.write(farc_bytes_from_files([('z', b'new_z')], 'FArc', 16))
+            utime(joinpath(d, 'b.farc'), ns=(0, 0)) # make sure mtime changes
+            self.assertEqual(overlay.refresh(), [joinpath(d, 'b.farc')])
+            self.assertEqual(overlay.read('y'), b'a_y')
+            self.assertEqual(overlay.read('z'), b'new_z')
+            
+            overlay.unmount(joinpath(d, 'a.farc'))
+            self.assertNotIn('x', overlay)
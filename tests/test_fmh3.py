@@ -3,6 +3,8 @@ from os.path import join as joinpath, dirname, exists as pathexists
 import json
 import hashlib
 from pydiva import pyfarc, pyfmh3
+from pydiva.pyfmh3_formats import _fmh3_types
+from pydiva.util.stats import Stats
 
 def files_dict_from_farc_stream(s):
     farc = pyfarc.from_stream(s)
@@ -25,6 +27,25 @@ with open(joinpath(module_dir, 'data', 'checksums.json'), 'r') as f:
 with open(joinpath(module_dir, 'data', 'fontmap_ref_json.farc'), 'rb') as f:
     refdata = files_dict_from_farc_stream(f)
 
+def fonm_bytes_from_construct(fmh):
+    """Builds FONM data using the Construct struct instead of pyfmh3's direct writer."""
+    
+    fmh3_type = _fmh3_types[fmh['fmh3_type']]
+    fonts = [{'data': dict(font, chars_count=len(font['chars']))} for font in fmh['fonts']]
+    
+    pyfmh3._fonts_pointers_min_offset = fmh3_type['fonts_pointers_min_offset']
+    pyfmh3._set_font_pointers(fonts, fmh3_type['address_size'])
+    pyfmh3._set_char_pointers(fonts, fmh3_type['address_size'])
+    
+    return fmh3_type['struct'].build({
+        'FONM': dict(section_outer=dict(section=dict(
+            data_pointer=64,
+            data_size=pyfmh3._get_fmh3_length(fonts),
+            data=dict(fonts_count=len(fonts), fonts_pointers_offset=pyfmh3._fonts_pointers_min_offset, fonts=fonts),
+            extra_sections=dict()
+        )))
+    })
+
 
 class TestFmhRead(unittest.TestCase):
     def test_read_aft(self):
@@ -77,4 +98,50 @@ class TestFmhWrite(unittest.TestCase):
         fmh = json.loads(refdata['fontmap_f2.json'])
         b = pyfmh3.to_bytes(fmh)
         c = hashlib.sha1(b).hexdigest()
-        self.assertEqual(c, checksums['fontmap_f2.fnm'])
\ No newline at end of file
+        self.assertEqual(c, checksums['fontmap_f2.fnm'])
+    
+    # generated fontmaps check that writing is consistent with reading for all types, including many chars
+    
+    def _test_write_generated(self, fmh3_type):
+        fmh = {'fmh3_type': fmh3_type, 'fonts': []}
+        for i, n in enumerate([20000, 1, 13, 2]):
+            fmh['fonts'] += [{'id': i, 'advance_width': 24, 'line_height': 30, 'box_width': 26, 'box_height': 32, 'layout_param_1': 3, 'layout_param_2_numerator': 1, 'layout_param_2_denominator': 2, 'other_params?': 0, 'tex_size_chars': 19,
+                'chars': [{'codepoint': 0x4e00 + c, 'halfwidth': bool(c % 2), 'tex_col': c % 19, 'tex_row': (c // 19) % 256, 'glyph_x': 1, 'glyph_width': 24} for c in range(n)]}]
+        
+        b = pyfmh3.to_bytes(fmh)
+        self.assertEqual(pyfmh3.from_bytes(b), fmh)
+    
+    def test_write_generated_aft(self):
+        self._test_write_generated('FMH3')
+    
+    def test_write_generated_x(self):
+        self._test_write_generated('FONM')
+    
+    def test_write_generated_f2(self):
+        self._test_write_generated('FONM_F2')
+    
+    def test_write_empty(self):
+        font = {'id': 0, 'advance_width': 24, 'line_height': 30, 'box_width': 26, 'box_height': 32, 'layout_param_1': 3, 'layout_param_2_numerator': 1, 'layout_param_2_denominator': 2, 'other_params?': 0, 'tex_size_chars': 19,
+            'chars': [{'codepoint': 0x4e00, 'halfwidth': False, 'tex_col': 0, 'tex_row': 0, 'glyph_x': 1, 'glyph_width': 24}]}
+        for fmh3_type in ['FMH3', 'FONM', 'FONM_F2']:
+            with self.subTest(fmh3_type=fmh3_type):
+                with self.assertRaises(ValueError):
+                    pyfmh3.to_bytes({'fmh3_type': fmh3_type, 'fonts': []})
+                with self.assertRaises(ValueError):
+                    pyfmh3.to_bytes({'fmh3_type': fmh3_type, 'fonts': [font, dict(font, id=1, chars=[]), dict(font, id=2)]})
+    
+    def test_construct_build_matches_writer(self):
+        for fname in ['fontmap_x.json', 'fontmap_f2.json']:
+            fmh = json.loads(refdata[fname])
+            self.assertEqual(fonm_bytes_from_construct(fmh), pyfmh3.to_bytes(fmh))
+
+
+class TestFmhStats(unittest.TestCase):
+    def test_fmh3_stats(self):
+        stats = Stats()
+        with open(joinpath(module_dir, 'data', 'fontmap_x', 'fontmap.fnm'), 'rb') as f:
+            fmh = pyfmh3.from_stream(f, stats=stats)
+        self.assertEqual(set(stats.stages), {'sniff', 'parse', 'convert'})
+        pyfmh3.to_bytes(fmh, stats=stats)
+        self.assertIn('build', stats.stages)
+        self.assertEqual(stats.counters['entries'], len(fmh['fonts']) * 2)
@@ -0,0 +1,40 @@
+import unittest
+from os.path import join as joinpath
+from io import BytesIO
+import pydiva
+from tests.test_farc import farc_bytes_from_files, customdata, module_dir
+
+
+class TestIdentify(unittest.TestCase):
+    
+    def test_identify_farc(self):
+        res = pydiva.identify(joinpath(module_dir, 'data', 'fontmap_aft.farc'))
+        self.assertEqual((res['type'], res['subformat'], res['compressed'], res['encrypted'], res['alignment']), ('farc', 'FArC', True, False, 1))
+        
+        res = pydiva.identify(joinpath(module_dir, 'data', 'fontmap_x.farc'))
+        self.assertEqual((res['type'], res['subformat'], res['compressed'], res['encrypted'], res['alignment']), ('farc', 'FARC', True, True, 16))
+    
+    def test_identify_farc_ft(self):
+        b = farc_bytes_from_files(customdata, 'FARC_FT', 64, True, True)
+        with BytesIO(b) as s:
+            s.seek(0)
+            res = pydiva.identify(s)
+            self.assertEqual(s.tell(), 0)
+        self.assertEqual(res['subformat'], 'FARC_FT')
+        self.assertTrue(res['header_encrypted'])
+        self.assertEqual(res['alignment'], 64)
+        self.assertEqual(res['entry_count'], len(customdata))
+        
+        res = pydiva.identify(BytesIO(farc_bytes_from_files(customdata, 'FARC_FT', 16, False, False)))
+        self.assertFalse(res['header_encrypted'])
+        self.assertEqual(res['entry_count'], len(customdata))
+    
+    def test_identify_fontmap(self):
+        res = pydiva.identify(joinpath(module_dir, 'data', 'fontmap_f2', 'fontmap.fnm'))
+        self.assertEqual((res['type'], res['subformat'], res['entry_count']), ('fmh3', 'FONM_F2', 10))
+    
+    def test_identify_many(self):
+        paths = [joinpath(module_dir, 'data', p) for p in ['files.txt', 'fontmap_m39.farc', 'fontmap_x/fontmap.fnm', 'customdata/zero-length']]
+        res = pydiva.identify_many(paths, workers=4)
+        self.assertEqual([r['subformat'] for r in res], [None, 'FARC_FT', 'FONM', None])
+        self.assertEqual(res, pydiva.identify_many(paths, workers=1))
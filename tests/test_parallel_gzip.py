@@ -0,0 +1,32 @@
+import unittest
+import gzip
+import zlib
+from pydiva import pyfarc
+from pydiva.util import parallel_gzip
+from tests.test_farc import farc_bytes_from_files, files_from_farc_bytes, customdata
+
+
+class TestParallelGzip(unittest.TestCase):
+    
+    def test_crc32_combine(self):
+        a, b = customdata[0][1], customdata[1][1] + b'x'
+        self.assertEqual(parallel_gzip.crc32_combine(zlib.crc32(a), zlib.crc32(b), len(b)), zlib.crc32(a + b))
+    
+    def test_compress(self):
+        data = b''.join(data for fname, data in customdata) * 20
+        for block_size in [1000, 4096, len(data), len(data) * 2]:
+            compressed = parallel_gzip.compress(data, mtime=39, block_size=block_size, workers=4)
+            self.assertEqual(zlib.decompress(compressed, wbits=16+zlib.MAX_WBITS), data)
+            self.assertEqual(compressed[:10], gzip.compress(b'', mtime=39)[:10])
+        self.assertEqual(zlib.decompress(parallel_gzip.compress(b''), wbits=16+zlib.MAX_WBITS), b'')
+    
+    def test_farc_threshold(self):
+        data = customdata[0][1] * 100
+        threshold = pyfarc._parallel_compress_threshold
+        try:
+            pyfarc._parallel_compress_threshold = 1000
+            b = farc_bytes_from_files([('big', data), ('small', b'small')], 'FArC')
+        finally:
+            pyfarc._parallel_compress_threshold = threshold
+        self.assertNotEqual(b, farc_bytes_from_files([('big', data), ('small', b'small')], 'FArC'))
+        self.assertEqual(files_from_farc_bytes(b), [('big', data), ('small', b'small')])
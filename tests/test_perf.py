@@ -0,0 +1,217 @@
+import unittest
+from os import environ, urandom, devnull
+from os.path import join as joinpath
+from io import BytesIO
+from time import perf_counter
+import random
+import tempfile
+import tracemalloc
+from pydiva import pyfarc
+from pydiva.util.cs3_file_utils import RelocationTableBuilder, gen_relocation_data, parse_relocation_data
+
+# these generate large fixtures and are slow, so they only run when asked for
+perf_tests_enabled = bool(environ.get('PYDIVA_PERF_TESTS'))
+
+MiB = 1024*1024
+big_size = 4*MiB
+
+farc_types = ['FArc', 'FArC', 'FARC', 'FARC_FT']
+
+def farc_dict(files, farc_type):
+    return {
+        'farc_type': 'FARC' if farc_type == 'FARC_FT' else farc_type,
+        'format': 1 if farc_type == 'FARC_FT' else 0,
+        'flags': {'encrypted': farc_type in ['FARC', 'FARC_FT'], 'compressed': True},
+        'files': {fname: {'data': data} for fname, data in files.items()}
+    }
+
+def peak_memory(func):
+    """Runs func, returning (peak bytes allocated while running, result)."""
+    
+    tracemalloc.start()
+    try:
+        result = func()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak, result
+
+def best_time(func, number=3):
+    times = []
+    for i in range(number):
+        start = perf_counter()
+        func()
+        times += [perf_counter() - start]
+    return min(times)
+
+
+class CountingStream:
+    """Wraps a seekable stream, counting reads and bytes read."""
+    
+    def __init__(self, s):
+        self._s = s
+        self.reads = 0
+        self.bytes_read = 0
+    
+    def read(self, size=-1):
+        data = self._s.read(size)
+        self.reads += 1
+        self.bytes_read += len(data)
+        return data
+    
+    def readinto(self, b):
+        n = self._s.readinto(b)
+        self.reads += 1
+        self.bytes_read += n
+        return n
+    
+    def seek(self, *args):
+        return self._s.seek(*args)
+    
+    def tell(self):
+        return self._s.tell()
+
+
+@unittest.skipUnless(perf_tests_enabled, 'set PYDIVA_PERF_TESTS=1 to run performance tests')
+class TestFarcMemory(unittest.TestCase):
+    
+    @classmethod
+    def setUpClass(cls):
+        # thousands of tiny files plus large incompressible and compressible files
+        cls.files = {'small{:04}'.format(i): urandom(64) for i in range(2000)}
+        cls.files['big_random'] = urandom(big_size)
+        cls.files['big_zeros'] = bytes(big_size)
+        
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.archives = {}
+        cls.paths = {}
+        for farc_type in farc_types:
+            cls.archives[farc_type] = pyfarc.to_bytes(farc_dict(cls.files, farc_type))
+            cls.paths[farc_type] = joinpath(cls.tmp.name, farc_type + '.farc')
+            with open(cls.paths[farc_type], 'wb') as f:
+                f.write(cls.archives[farc_type])
+            
+            # warm up (generates format structs and imports on first use) so they aren't counted
+            pyfarc.from_bytes(pyfarc.to_bytes(farc_dict({'a': b'a'}, farc_type)))
+    
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+    
+    def header_size(self, farc_type):
+        b = self.archives[farc_type]
+        return 8 + int.from_bytes(b[4:8], byteorder='big', signed=False)
+    
+    def table_memory_bound(self, farc_type):
+        # parsed tables are python objects (~600 bytes/file), but shouldn't depend on file data size
+        return 100 * self.header_size(farc_type) + 256*1024
+    
+    def test_table_only(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                s = CountingStream(BytesIO(self.archives[farc_type]))
+                peak, table = peak_memory(lambda: pyfarc.table_from_stream(s))
+                self.assertEqual(len(table['files']), len(self.files))
+                self.assertLess(peak, self.table_memory_bound(farc_type))
+                self.assertLess(peak, big_size)
+                self.assertLessEqual(s.reads, 2)
+                self.assertEqual(s.bytes_read, self.header_size(farc_type))
+    
+    def test_read_entry(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                with BytesIO(self.archives[farc_type]) as s:
+                    table = pyfarc.table_from_stream(s)
+                    
+                    # stored + decrypted + decompressed copies at most
+                    peak, data = peak_memory(lambda: pyfarc.file_from_stream(s, table, 'big_random'))
+                    self.assertEqual(len(data), big_size)
+                    self.assertLess(peak, 3.5 * big_size)
+                    
+                    # stored copy + decoding chunks at most
+                    buffer = bytearray(big_size)
+                    for fname in ['big_random', 'big_zeros']:
+                        peak, n = peak_memory(lambda: pyfarc.read_entry_into(s, table, fname, buffer))
+                        self.assertEqual(n, big_size)
+                        self.assertLess(peak, table['files'][fname]['stored_size'] + MiB)
+    
+    def test_from_stream_reads(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                s = CountingStream(BytesIO(self.archives[farc_type]))
+                farc = pyfarc.from_stream(s)
+                self.assertEqual(len(farc['files']), len(self.files))
+                self.assertLessEqual(s.reads, 2 + len(self.files))
+                self.assertLessEqual(s.bytes_read, len(self.archives[farc_type]))
+    
+    def test_writer(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                data = farc_dict(self.files, farc_type)
+                with open(devnull, 'wb') as f:
+                    peak, report = peak_memory(lambda: pyfarc.to_stream(data, f, no_copy=True))
+                self.assertEqual(report['size'], len(self.archives[farc_type]))
+                self.assertLess(peak, 4 * big_size)
+    
+    def test_iter_from_stream(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                def _iter():
+                    with BytesIO(self.archives[farc_type]) as s:
+                        return sum(1 for fname, data in pyfarc.iter_from_stream(s))
+                
+                peak, n = peak_memory(_iter)
+                self.assertEqual(n, len(self.files))
+                self.assertLess(peak, self.table_memory_bound(farc_type) + 3.5 * big_size)
+    
+    def test_verify_chunked(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                peak, report = peak_memory(lambda: pyfarc.verify(self.paths[farc_type], workers=1, chunk_size=64*1024))
+                self.assertTrue(report['ok'])
+                self.assertLess(peak, self.table_memory_bound(farc_type) + MiB)
+    
+    def test_diff_chunked(self):
+        for farc_type in farc_types:
+            with self.subTest(farc_type=farc_type):
+                path = self.paths[farc_type]
+                peak, result = peak_memory(lambda: pyfarc.diff(path, path, chunk_size=64*1024))
+                self.assertEqual(len(result['unchanged']), len(self.files))
+                self.assertLess(peak, 2 * self.table_memory_bound(farc_type) + MiB)
+
+
+@unittest.skipUnless(perf_tests_enabled, 'set PYDIVA_PERF_TESTS=1 to run performance tests')
+class TestRelocationScaling(unittest.TestCase):
+    
+    # linear work would take 4x as long for 4x the pointers, quadratic 16x -- allow plenty of noise
+    max_ratio = 8
+    
+    def offsets(self, n):
+        random.seed(39)
+        return sorted(random.sample(range(n * 8), n))
+    
+    def test_gen_relocation_data(self):
+        small, large = self.offsets(50000), self.offsets(200000)
+        ratio = best_time(lambda: gen_relocation_data(large)) / best_time(lambda: gen_relocation_data(small))
+        self.assertLess(ratio, self.max_ratio)
+    
+    def test_parse_relocation_data(self):
+        small, large = gen_relocation_data(self.offsets(50000)), gen_relocation_data(self.offsets(200000))
+        ratio = best_time(lambda: parse_relocation_data(large)) / best_time(lambda: parse_relocation_data(small))
+        self.assertLess(ratio, self.max_ratio)
+    
+    def test_builder(self):
+        def build(offsets):
+            builder = RelocationTableBuilder()
+            for o in offsets:
+                builder.add(o)
+            return builder.data()
+        
+        small, large = self.offsets(50000)[::-1], self.offsets(200000)[::-1]
+        ratio = best_time(lambda: build(large)) / best_time(lambda: build(small))
+        self.assertLess(ratio, self.max_ratio)
+    
+    def test_relocation_memory(self):
+        small, large = self.offsets(50000), self.offsets(200000)
+        ratio = peak_memory(lambda: gen_relocation_data(large))[0] / peak_memory(lambda: gen_relocation_data(small))[0]
+        self.assertLess(ratio, self.max_ratio)
@@ -0,0 +1,24 @@
+import unittest
+from pydiva import pyfarc
+from pydiva.util.stats import Stats
+from tests.test_farc import customdata
+
+
+class TestStats(unittest.TestCase):
+    
+    def test_farc_stats(self):
+        stats = Stats()
+        b = pyfarc.to_bytes({'farc_type': 'FARC', 'format': 1, 'flags': {'encrypted': True, 'compressed': True}, 'files': {fname: {'data': data} for fname, data in customdata}}, stats=stats)
+        for stage in ['copy', 'deflate', 'encrypt', 'build', 'header_encrypt', 'write']:
+            self.assertIn(stage, stats.stages)
+        self.assertEqual(stats.stages['write']['bytes_out'], len(b))
+        
+        stats = Stats()
+        calls = []
+        stats.callback = lambda stage, elapsed, bytes_in, bytes_out: calls.append(stage)
+        pyfarc.from_bytes(b, stats=stats)
+        for stage in ['sniff', 'header_decrypt', 'table_parse', 'read', 'decrypt', 'inflate']:
+            self.assertIn(stage, stats.stages)
+        self.assertEqual(stats.counters['entries'], len(customdata))
+        self.assertEqual(stats.peaks['entry_size'], max(len(data) for fname, data in customdata))
+        self.assertEqual(len(calls), sum(s['calls'] for s in stats.stages.values()))